@@ -7,6 +7,15 @@ from pathlib import Path
 from api.config import api_config
 from api.routes import tasks_router
 from database import init_db
+from database.cache import task_cache
+from database.connection import close_db_connection
+from database.events import TaskEventConsumer
+
+
+async def _invalidate_cache(events):
+    """Сбросить кэш пользователей, чьи задачи изменились (в том числе ботом)"""
+    for user_id in {event.user_id for event in events}:
+        task_cache.invalidate_user(user_id)
 
 
 @asynccontextmanager
@@ -14,11 +23,16 @@ async def lifespan(app: FastAPI):
     """Lifecycle события приложения"""
     # Startup
     await init_db()
+    task_events = TaskEventConsumer(_invalidate_cache)
+    if task_cache.enabled:
+        await task_events.start()
     print("✅ API сервер запущен")
     
     yield
     
     # Shutdown
+    await task_events.stop()
+    await close_db_connection()
     print("⏹ API сервер остановлен")
 
 
@@ -50,6 +64,12 @@ async def health_check():
     return {"status": "ok", "service": "TaskBot API"}
 
 
+@app.get("/api/health/cache")
+async def cache_stats():
+    """Статистика кэша задач: доля попаданий и занимаемая память"""
+    return task_cache.stats()
+
+
 # Статика для Mini App (production: раздаём собранный dist/, dev: webapp/)
 webapp_dist = Path(__file__).parent.parent / "webapp" / "dist"
 if webapp_dist.exists():
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from api.schemas import (
     TaskCreate,
@@ -10,16 +13,53 @@ from api.schemas import (
     TaskToggle,
     CountsResponse
 )
-from api.schemas.task import MessageResponse
+from api.schemas.task import (
+    BatchItemResult,
+    BatchRequest,
+    BatchResponse,
+    ImportResponse,
+    MessageResponse,
+    TaskChangesResponse,
+    TaskImport,
+    TaskRangeResponse
+)
 from api.middleware import get_user_id
-from database import TaskRepository
+from database import Task, TaskRepository
 
 router = APIRouter(prefix="/api/tasks", tags=["tasks"])
 
+# Импорт: задач в одной транзакции и максимальная длина строки NDJSON
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_LINE = 64 * 1024
+# Сколько ошибок разбора возвращать в ответе
+IMPORT_MAX_ERRORS = 20
+
+# Календарь: самый длинный период запроса и сколько задач отдавать
+RANGE_MAX_DAYS = 92
+RANGE_MAX_TASKS = 1000
+
+
+def _task_response(task: Task) -> TaskResponse:
+    return TaskResponse(
+        id=task.id,
+        text=task.text,
+        category=task.category,
+        event_at=task.event_at.isoformat() if task.event_at else None,
+        remind_at=task.remind_at.isoformat() if task.remind_at else None,
+        reminder_offset_minutes=task.reminder_offset_minutes,
+        completed=task.completed,
+        created_at=task.created_at.isoformat(),
+        updated_at=task.updated_at.isoformat(),
+        version=task.version
+    )
+
 
 @router.get("", response_model=TaskListResponse)
 async def get_tasks(
     filter: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    archive: Optional[bool] = None,
     user_id: int = Depends(get_user_id)
 ):
     """
@@ -27,36 +67,30 @@ async def get_tasks(
     
     Параметры:
     - filter: all, today, active, completed
+    - limit: размер страницы (без него возвращаются все задачи)
+    - cursor: next_cursor из предыдущей страницы
+    - archive: включать ли архив выполненных задач; по умолчанию — только
+      при постраничной загрузке (с limit)
     """
-    # Получаем задачи в зависимости от фильтра
-    if filter == "today":
-        tasks = await TaskRepository.get_today(user_id)
-    elif filter == "active":
-        tasks = await TaskRepository.get_active(user_id)
-    elif filter == "completed":
-        tasks = await TaskRepository.get_completed(user_id)
-    else:
-        tasks = await TaskRepository.get_all_by_user(user_id)
+    try:
+        page = await TaskRepository.get_page(
+            user_id, filter, limit=limit, cursor=cursor, include_archive=archive
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
     # Получаем счётчики
     counts = await TaskRepository.get_counts(user_id)
     
     return TaskListResponse(
         tasks=[
-            TaskResponse(
-                id=t.id,
-                text=t.text,
-                category=t.category,
-                event_at=t.event_at.isoformat() if t.event_at else None,
-                remind_at=t.remind_at.isoformat() if t.remind_at else None,
-                reminder_offset_minutes=t.reminder_offset_minutes,
-                completed=t.completed,
-                created_at=t.created_at.isoformat(),
-                updated_at=t.updated_at.isoformat()
-            )
-            for t in tasks
+            _task_response(t)
+            for t in page.tasks
         ],
-        counts=counts
+        counts=counts,
+        next_cursor=page.next_cursor,
+        # Версия из того же снимка, что и страница (и закэширована вместе с ней)
+        version=page.version
     )
 
 
@@ -67,6 +101,177 @@ async def get_counts(user_id: int = Depends(get_user_id)):
     return CountsResponse(**counts)
 
 
+@router.get("/changes", response_model=TaskChangesResponse)
+async def get_changes(
+    since: int = Query(..., ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    user_id: int = Depends(get_user_id)
+):
+    """
+    Изменения задач после версии since (дельта-синхронизация)
+
+    Параметры:
+    - since: version из списка задач или предыдущего ответа /changes
+    - limit: не больше стольких изменений за раз (has_more — есть ещё)
+
+    При full_resync=true нужно заново загрузить список задач.
+    """
+    changes = await TaskRepository.get_changes(user_id, since, limit=limit)
+
+    return TaskChangesResponse(
+        tasks=[
+            _task_response(t)
+            for t in changes.tasks
+        ],
+        deleted=changes.deleted,
+        version=changes.version,
+        has_more=changes.has_more,
+        full_resync=changes.full_resync
+    )
+
+
+@router.get("/search", response_model=TaskListResponse)
+async def search_tasks(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user_id: int = Depends(get_user_id)
+):
+    """
+    Поиск задач по тексту (включая архив)
+
+    Параметры:
+    - q: слова для поиска (каждое — по началу слова)
+    - limit: размер страницы
+    - cursor: next_cursor из предыдущей страницы
+    """
+    try:
+        page = await TaskRepository.search(user_id, q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return TaskListResponse(
+        tasks=[
+            _task_response(t)
+            for t in page.tasks
+        ],
+        next_cursor=page.next_cursor
+    )
+
+
+@router.get("/range", response_model=TaskRangeResponse)
+async def get_range(
+    start: datetime = Query(..., alias="from", description="Начало периода (включительно)"),
+    end: datetime = Query(..., alias="to", description="Конец периода (не включительно)"),
+    tasks: bool = Query(True, description="Вернуть задачи периода"),
+    days: bool = Query(False, description="Вернуть число задач по дням"),
+    user_id: int = Depends(get_user_id)
+):
+    """
+    Задачи за период — для календаря
+
+    Время задачи — время события, у задач без него — время напоминания.
+    Для сетки месяца достаточно days=true&tasks=false: приходят только
+    счётчики по дням. Период — не длиннее RANGE_MAX_DAYS дней.
+    """
+    # Время с часовым поясом переводим в локальное — так хранятся задачи
+    start, end = (
+        value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+        for value in (start, end)
+    )
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if end - start > timedelta(days=RANGE_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Range is longer than {RANGE_MAX_DAYS} days")
+
+    response = TaskRangeResponse()
+    if tasks:
+        response.tasks = [
+            _task_response(t)
+            for t in await TaskRepository.get_range(user_id, start, end, limit=RANGE_MAX_TASKS)
+        ]
+    if days:
+        response.days = await TaskRepository.get_day_counts(user_id, start, end)
+    return response
+
+
+@router.get("/export")
+async def export_tasks(user_id: int = Depends(get_user_id)):
+    """
+    Выгрузить все задачи пользователя в формате NDJSON
+
+    Одна задача — одна строка JSON. Строки отдаются потоком прямо из
+    курсора БД, список целиком не собирается.
+    """
+    async def lines():
+        async for task in TaskRepository.iter_all(user_id):
+            data = task.to_dict()
+            del data['user_id']
+            yield json.dumps(data, ensure_ascii=False) + '\n'
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="tasks.ndjson"'}
+    )
+
+
+@router.post("/import", response_model=ImportResponse)
+async def import_tasks(
+    request: Request,
+    user_id: int = Depends(get_user_id)
+):
+    """
+    Загрузить задачи из NDJSON (формат экспорта)
+
+    Тело читается потоком и разбирается построчно; задачи записываются
+    пачками по IMPORT_BATCH_SIZE в отдельных транзакциях. Строки с
+    ошибками пропускаются, уже записанные пачки при ошибке не откатываются.
+    """
+    imported = 0
+    skipped = 0
+    errors = []
+    batch = []
+    buffer = b''
+    line_no = 0
+
+    def parse(line: bytes):
+        nonlocal skipped
+        if not line.strip():
+            return
+        try:
+            task = TaskImport.model_validate_json(line)
+        except ValidationError as e:
+            skipped += 1
+            if len(errors) < IMPORT_MAX_ERRORS:
+                errors.append(f"line {line_no}: {e.errors()[0]['msg']}")
+            return
+        batch.append(task.model_dump())
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *complete, buffer = buffer.split(b'\n')
+        for line in complete:
+            line_no += 1
+            parse(line)
+        if len(buffer) > IMPORT_MAX_LINE:
+            raise HTTPException(status_code=413, detail=f"Line {line_no + 1} is too long")
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            imported += await TaskRepository.create_many(user_id, batch)
+            batch = []
+
+    line_no += 1
+    parse(buffer)
+    imported += await TaskRepository.create_many(user_id, batch)
+
+    return ImportResponse(
+        status="imported",
+        imported=imported,
+        skipped=skipped,
+        errors=errors
+    )
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: int,
@@ -78,17 +283,7 @@ async def get_task(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return TaskResponse(
-        id=task.id,
-        text=task.text,
-        category=task.category,
-        event_at=task.event_at.isoformat() if task.event_at else None,
-        remind_at=task.remind_at.isoformat() if task.remind_at else None,
-        reminder_offset_minutes=task.reminder_offset_minutes,
-        completed=task.completed,
-        created_at=task.created_at.isoformat(),
-        updated_at=task.updated_at.isoformat()
-    )
+    return _task_response(task)
 
 
 @router.post("", response_model=MessageResponse)
@@ -97,7 +292,7 @@ async def create_task(
     user_id: int = Depends(get_user_id)
 ):
     """Создать новую задачу"""
-    task_id = await TaskRepository.create(
+    created = await TaskRepository.create(
         user_id=user_id,
         text=task.text,
         category=task.category,
@@ -109,7 +304,8 @@ async def create_task(
     return MessageResponse(
         status="created",
         message="Task created successfully",
-        id=task_id
+        id=created.id,
+        task=_task_response(created)
     )
 
 
@@ -120,13 +316,14 @@ async def update_task(
     user_id: int = Depends(get_user_id)
 ):
     """Обновить задачу"""
-    # Проверяем существование
-    existing = await TaskRepository.get_by_id(task_id, user_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    # Обновляем
-    success = await TaskRepository.update(
+    if not task.model_dump(exclude_none=True):
+        # Менять нечего: как и раньше, неизвестная задача — 404, иначе 400
+        if await TaskRepository.get_by_id(task_id, user_id) is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        raise HTTPException(status_code=400, detail="Update failed")
+
+    # Существование проверяет сам UPDATE ... RETURNING
+    updated = await TaskRepository.update(
         task_id=task_id,
         user_id=user_id,
         text=task.text,
@@ -137,12 +334,14 @@ async def update_task(
         completed=task.completed
     )
     
-    if not success:
-        raise HTTPException(status_code=400, detail="Update failed")
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     
     return MessageResponse(
         status="updated",
-        message="Task updated successfully"
+        message="Task updated successfully",
+        id=updated.id,
+        task=_task_response(updated)
     )
 
 
@@ -152,17 +351,46 @@ async def toggle_task(
     user_id: int = Depends(get_user_id)
 ):
     """Переключить статус выполнения"""
-    success = await TaskRepository.toggle_completed(data.task_id, user_id)
+    toggled = await TaskRepository.toggle_completed(data.task_id, user_id)
     
-    if not success:
+    if toggled is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
     return MessageResponse(
         status="toggled",
-        message="Task status toggled"
+        message="Task status toggled",
+        id=toggled.id,
+        task=_task_response(toggled)
     )
 
 
+@router.post("/batch", response_model=BatchResponse)
+async def batch_tasks(
+    batch: BatchRequest,
+    user_id: int = Depends(get_user_id)
+):
+    """
+    Выполнить пакет операций create/update/toggle/delete
+
+    Все операции выполняются одной транзакцией в порядке запроса; ошибка
+    отдельной операции (задача не найдена, пустые данные) не отменяет
+    остальные и возвращается в её результате.
+    """
+    operations = []
+    for operation in batch.operations:
+        item = {'op': operation.op, 'task_id': operation.task_id}
+        if operation.data is not None:
+            item.update(operation.data.model_dump(exclude_none=True))
+        operations.append(item)
+
+    results = await TaskRepository.batch(user_id, operations)
+
+    return BatchResponse(results=[
+        BatchItemResult(op=operation.op, status=result.status, id=result.id)
+        for operation, result in zip(batch.operations, results)
+    ])
+
+
 @router.delete("/{task_id}", response_model=MessageResponse)
 async def delete_task(
     task_id: int,
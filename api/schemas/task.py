@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Literal, Optional, List
 from datetime import datetime
 
 
@@ -24,6 +24,14 @@ class TaskCreate(BaseModel):
         }
 
 
+class TaskImport(TaskCreate):
+    """Строка NDJSON-импорта (формат совпадает с экспортом, лишние поля игнорируются)"""
+    completed: bool = False
+    # None (старые выгрузки) — отправленным считается напоминание в прошлом
+    notified: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+
 class TaskUpdate(BaseModel):
     """Схема обновления задачи"""
     text: Optional[str] = Field(None, min_length=1, max_length=500)
@@ -34,6 +42,19 @@ class TaskUpdate(BaseModel):
     completed: Optional[bool] = None
 
 
+class BatchOperation(BaseModel):
+    """Операция пакета: create — поля задачи в data (text обязателен),
+    update — task_id и изменяемые поля в data, toggle и delete — task_id"""
+    op: Literal['create', 'update', 'toggle', 'delete']
+    task_id: Optional[int] = None
+    data: Optional[TaskUpdate] = None
+
+
+class BatchRequest(BaseModel):
+    """Схема пакета операций (выполняется одной транзакцией)"""
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=500)
+
+
 class TaskToggle(BaseModel):
     """Схема переключения статуса"""
     task_id: int
@@ -50,6 +71,8 @@ class TaskResponse(BaseModel):
     completed: bool
     created_at: str
     updated_at: str
+    # Версия последнего изменения (для дельта-синхронизации)
+    version: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -59,6 +82,26 @@ class TaskListResponse(BaseModel):
     """Схема списка задач"""
     tasks: List[TaskResponse]
     counts: Optional[dict] = None
+    # Курсор следующей страницы (только при запросе с limit); None — страниц больше нет
+    next_cursor: Optional[str] = None
+    # Версия изменений на момент запроса — since для /api/tasks/changes
+    version: Optional[int] = None
+
+
+class TaskChangesResponse(BaseModel):
+    """Схема изменений задач после версии since"""
+    tasks: List[TaskResponse]
+    deleted: List[int]
+    version: int
+    has_more: bool = False
+    full_resync: bool = False
+
+
+class TaskRangeResponse(BaseModel):
+    """Схема задач за период (календарь)"""
+    tasks: List[TaskResponse] = []
+    # Число задач по дням "YYYY-MM-DD" (только при days=true; дни без задач не приходят)
+    days: Optional[Dict[str, int]] = None
 
 
 class CountsResponse(BaseModel):
@@ -74,3 +117,27 @@ class MessageResponse(BaseModel):
     status: str
     message: Optional[str] = None
     id: Optional[int] = None
+    # Задача после изменения (create, update, toggle)
+    task: Optional[TaskResponse] = None
+
+
+class BatchItemResult(BaseModel):
+    """Результат одной операции пакета"""
+    op: str
+    # created, updated, toggled, deleted, not_found, invalid
+    status: str
+    id: Optional[int] = None
+
+
+class BatchResponse(BaseModel):
+    """Результаты пакета — в порядке операций запроса"""
+    results: List[BatchItemResult]
+
+
+class ImportResponse(BaseModel):
+    """Результат импорта задач"""
+    status: str
+    imported: int
+    skipped: int = 0
+    # Первые ошибки разбора строк: "строка N: описание"
+    errors: List[str] = []
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк онлайн-бэкапа (database.backup.backup_database)
+
+Заполняет временную базу задачами и измеряет задержку записи
+(TaskRepository.create) без бэкапа и во время него — для нескольких
+размеров шага копирования. Показывает длительность самого бэкапа.
+
+Использование:
+    python benchmarks/bench_backup.py [число задач]
+    python benchmarks/bench_backup.py 300000
+"""
+
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import database.backup as backup  # noqa: E402
+import database.connection as connection  # noqa: E402
+from database import TaskRepository  # noqa: E402
+
+# (страниц за шаг, пауза в мс)
+SETTINGS = [(64, 5), (256, 5), (1024, 5), (-1, 0)]
+# Пауза между записями нагрузки (с) — примерно 200 записей в секунду
+WRITE_PAUSE = 0.005
+
+
+def fill(path: Path, tasks: int):
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO tasks (user_id, text, category) VALUES (?, ?, ?)',
+        ((i % 5000, f'задача номер {i} ' * 4, 'task') for i in range(tasks))
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+async def writes_while(stop: asyncio.Event) -> list:
+    """Писать задачи, пока не выставлен ``stop``; вернуть задержки (с)."""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await TaskRepository.create(user_id=1, text='bench')
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(WRITE_PAUSE)
+    return latencies
+
+
+async def measure(pages: int, pause_ms: float):
+    stop = asyncio.Event()
+    writer = asyncio.create_task(writes_while(stop))
+    start = time.perf_counter()
+    if pages:
+        await backup.backup_database(pages=pages, pause_ms=pause_ms, keep=1)
+    else:
+        await asyncio.sleep(2)
+    seconds = time.perf_counter() - start
+    stop.set()
+    latencies = await writer
+
+    label = 'без бэкапа' if not pages else f'pages={pages:>5} pause={pause_ms:g} мс'
+    print(
+        f"{label:<28} {seconds:6.2f} с   записей {len(latencies):5}   "
+        f"p50 {percentile(latencies, 0.5):6.2f} мс   p99 {percentile(latencies, 0.99):6.2f} мс"
+    )
+
+
+async def main(tasks: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.DB_PATH = Path(tmp) / 'bench.db'
+        backup.BACKUP_DIR = str(Path(tmp) / 'backups')
+        await connection.init_db()
+        fill(connection.DB_PATH, tasks)
+        size = connection.DB_PATH.stat().st_size / backup.MIB
+        print(f"Задач: {tasks}, база {size:.1f} МиБ")
+        try:
+            await measure(0, 0)
+            for pages, pause_ms in SETTINGS:
+                await measure(pages, pause_ms)
+        finally:
+            await connection.close_db_connection()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000))
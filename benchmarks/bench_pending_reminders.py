@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк опроса напоминаний (TaskRepository.get_pending_reminders)
+
+Заполняет временную базу историческими (уже отправленными / выполненными)
+задачами и небольшим числом ожидающих напоминаний, затем сравнивает
+стоимость одного опроса:
+
+- old: прежний запрос (SELECT * по индексу remind_at, completed, notified)
+- new: текущий запрос по частичному индексу idx_tasks_pending_remind
+
+Использование:
+    python benchmarks/bench_pending_reminders.py [размер ...]
+    python benchmarks/bench_pending_reminders.py 10000 100000 1000000
+"""
+
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import database.connection as connection  # noqa: E402
+
+PENDING = 200
+LIMIT = 500
+REPEATS = 50
+
+OLD_QUERY = '''
+    SELECT * FROM tasks
+    WHERE remind_at <= ?
+    AND completed = FALSE
+    AND notified = FALSE
+'''
+
+NEW_QUERY = '''
+    SELECT id, user_id, text, category, remind_at, attempts, next_attempt_at
+    FROM tasks
+    WHERE remind_at <= ?
+    AND completed = 0
+    AND notified = 0
+    AND dead_letter_at IS NULL
+    AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+    ORDER BY remind_at
+    LIMIT ?
+'''
+
+
+def fill(conn: sqlite3.Connection, history: int):
+    """Историческая нагрузка + PENDING ожидающих напоминаний."""
+    base = datetime.now() - timedelta(days=365)
+    rows = (
+        (
+            i % 5000,
+            f'task {i}',
+            (base + timedelta(minutes=i % 500000)).isoformat(),
+            i % 3 == 0,
+        )
+        for i in range(history)
+    )
+    conn.executemany(
+        'INSERT INTO tasks (user_id, text, remind_at, completed, notified) VALUES (?, ?, ?, ?, 1)',
+        rows
+    )
+    soon = datetime.now() - timedelta(minutes=1)
+    conn.executemany(
+        'INSERT INTO tasks (user_id, text, remind_at) VALUES (?, ?, ?)',
+        ((i, f'pending {i}', soon.isoformat()) for i in range(PENDING))
+    )
+    conn.commit()
+
+
+def timed(conn: sqlite3.Connection, sql: str, params: tuple) -> float:
+    """Среднее время одного запроса в миллисекундах."""
+    conn.execute(sql, params).fetchall()  # прогрев кэша страниц
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def run(history: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        connection.DB_PATH = Path(tmp) / 'bench.db'
+        asyncio.run(connection.init_db())
+
+        conn = sqlite3.connect(connection.DB_PATH)
+        try:
+            fill(conn, history)
+            now = datetime.now().isoformat()
+
+            # Текущая схема: частичный индекс
+            new_ms = timed(conn, NEW_QUERY, (now, int(time.time()), LIMIT))
+
+            # Прежняя схема: составной индекс по всей таблице
+            conn.execute('DROP INDEX idx_tasks_pending_remind')
+            conn.execute('CREATE INDEX idx_tasks_remind ON tasks(remind_at, completed, notified)')
+            old_ms = timed(conn, OLD_QUERY, (now,))
+        finally:
+            conn.close()
+
+    print(f"{history:>10}  old {old_ms:9.3f} ms   new {new_ms:7.3f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"Ожидающих напоминаний: {PENDING}, повторов: {REPEATS}")
+    for size in sizes:
+        run(size)
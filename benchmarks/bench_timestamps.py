@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк форматов хранения временных меток (DB_TIMESTAMP_FORMAT)
+
+Строит две одинаковые базы — с ISO-строками и с целыми секундами Unix —
+и сравнивает:
+
+- decode: Task.from_rows для всех задач пользователя (как get_all_by_user)
+- range:  выборку задач пользователя за сутки по индексу (user_id, remind_at)
+
+Использование:
+    python benchmarks/bench_timestamps.py [задач] [пользователей]
+    python benchmarks/bench_timestamps.py 200000 200
+"""
+
+import asyncio
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import database.connection as connection  # noqa: E402
+from database.models import Task  # noqa: E402
+
+REPEATS = 20
+
+
+def encode(dt: datetime, fmt: str):
+    return int(dt.timestamp()) if fmt == 'epoch' else dt.isoformat()
+
+
+def build(path: Path, fmt: str, tasks: int, users: int):
+    connection.DB_PATH = path
+    asyncio.run(connection.init_db())
+    conn = sqlite3.connect(path)
+    base = datetime.now() - timedelta(days=180)
+
+    def rows():
+        for i in range(tasks):
+            at = base + timedelta(minutes=37 * i % (360 * 24 * 60))
+            yield (
+                i % users, f'task {i}', encode(at, fmt), encode(at, fmt),
+                i % 2, encode(base, fmt), encode(at, fmt)
+            )
+
+    conn.executemany(
+        '''
+        INSERT INTO tasks (user_id, text, event_at, remind_at, completed, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''',
+        rows()
+    )
+    conn.commit()
+    conn.execute('ANALYZE')
+    return conn
+
+
+def bench(conn: sqlite3.Connection, fmt: str, users: int):
+    # decode: все задачи одного пользователя
+    cursor = conn.execute('SELECT * FROM tasks WHERE user_id = ?', (1,))
+    rows = cursor.fetchall()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        Task.from_rows(rows, cursor.description)
+    decode_us = (time.perf_counter() - start) / (REPEATS * len(rows)) * 1e6
+
+    # range: задачи за сутки по каждому пользователю
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+    params = [(u, encode(day, fmt), encode(day + timedelta(days=1), fmt)) for u in range(users)]
+    sql = 'SELECT id, remind_at FROM tasks WHERE user_id = ? AND remind_at BETWEEN ? AND ?'
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for p in params:
+            conn.execute(sql, p).fetchall()
+    range_us = (time.perf_counter() - start) / (REPEATS * len(params)) * 1e6
+
+    size = conn.execute('PRAGMA page_count').fetchone()[0] * conn.execute('PRAGMA page_size').fetchone()[0]
+    print(
+        f"{fmt:>6}  decode {decode_us:6.2f} us/row   range {range_us:7.2f} us/query   "
+        f"file {size / 1024 / 1024:6.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    tasks = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"Задач: {tasks}, пользователей: {users}, повторов: {REPEATS}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ('iso', 'epoch'):
+            conn = build(Path(tmp) / f'{fmt}.db', fmt, tasks, users)
+            try:
+                bench(conn, fmt, users)
+            finally:
+                conn.close()
@@ -66,9 +66,9 @@ async def callback_complete(callback: CallbackQuery):
     task_id = int(callback.data.split("_")[1])
     user_id = callback.from_user.id
     
-    success = await TaskRepository.toggle_completed(task_id, user_id)
+    task = await TaskRepository.toggle_completed(task_id, user_id)
     
-    if success:
+    if task is not None:
         await callback.answer("✅ Задача выполнена!", show_alert=False)
         await callback.message.edit_text(
             "✅ Задача отмечена выполненной!\n\nТак держать! 💪",
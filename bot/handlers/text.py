@@ -47,7 +47,7 @@ async def handle_text(message: Message):
         return
     
     # Сохраняем в базу
-    task_id = await TaskRepository.create(
+    task = await TaskRepository.create(
         user_id=user_id,
         text=parsed.text,
         category=parsed.category,
@@ -87,5 +87,5 @@ async def handle_text(message: Message):
     await message.answer(
         response,
         parse_mode="Markdown",
-        reply_markup=Keyboards.task_created(task_id)
+        reply_markup=Keyboards.task_created(task.id)
     )
@@ -68,7 +68,7 @@ async def create_task_from_parsed(message: Message, parsed: TaskParser):
         return
 
     # Сохраняем в базу
-    task_id = await TaskRepository.create(
+    task = await TaskRepository.create(
         user_id=user_id,
         text=parsed.text,
         category=parsed.category,
@@ -107,5 +107,5 @@ async def create_task_from_parsed(message: Message, parsed: TaskParser):
     await message.answer(
         response,
         parse_mode="Markdown",
-        reply_markup=Keyboards.task_created(task_id)
+        reply_markup=Keyboards.task_created(task.id)
     )
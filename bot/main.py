@@ -33,6 +33,7 @@ async def main():
     # Запускаем планировщик напоминаний
     scheduler = ReminderScheduler(bot)
     scheduler.start()
+    await scheduler.start_listening()
     
     print("🤖 Бот запущен!")
     print(f"📱 Mini App URL: {config.WEBAPP_URL}")
@@ -42,6 +43,7 @@ async def main():
         await dp.start_polling(bot)
     finally:
         scheduler.stop()
+        await scheduler.stop_listening()
         # Закрываем DB connection и сессию бота
         try:
             from database.connection import close_db_connection
@@ -0,0 +1,463 @@
+import asyncio
+import math
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from database.models import PendingReminder
+
+
+# Сколько напоминаний отправляется одновременно
+REMINDER_WORKERS = int(os.getenv('REMINDER_WORKERS', '16'))
+# Общий предел отправки (сообщений в секунду) и пауза между сообщениями в один чат (с)
+REMINDER_RATE = float(os.getenv('REMINDER_RATE', '30'))
+REMINDER_CHAT_INTERVAL = float(os.getenv('REMINDER_CHAT_INTERVAL', '1'))
+# Отметка «отправлено» пишется пачкой: по стольким задачам или раз в столько мс
+REMINDER_MARK_BATCH = int(os.getenv('REMINDER_MARK_BATCH', '200'))
+REMINDER_MARK_INTERVAL_MS = float(os.getenv('REMINDER_MARK_INTERVAL_MS', '1000'))
+# Повторы после ошибки отправки: не больше стольких попыток, пауза от базовой
+# удваивается с каждой попыткой до предельной (с)
+REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', '8'))
+REMINDER_RETRY_BASE_SECONDS = float(os.getenv('REMINDER_RETRY_BASE_SECONDS', '30'))
+REMINDER_RETRY_MAX_SECONDS = float(os.getenv('REMINDER_RETRY_MAX_SECONDS', '21600'))
+
+# За сколько последних секунд считается скорость отправки
+RATE_WINDOW_SECONDS = 10.0
+# RetryAfter в чат, куда за это время ничего не отправлялось, — общий лимит бота
+# (лимиты чатов Telegram считает по минуте: в группы — 20 сообщений в минуту)
+CHAT_LIMIT_WINDOW_SECONDS = 60.0
+# Статистика пишется в лог по окончании серии напоминаний, а в длинной
+# серии — не чаще раза в столько секунд
+STATS_LOG_INTERVAL_SECONDS = float(os.getenv('REMINDER_STATS_LOG_INTERVAL', '60'))
+
+
+def is_permanent(error: Exception) -> bool:
+    """Ошибка, которую повтор не исправит.
+
+    Forbidden — бот заблокирован или удалён из чата; BadRequest — запрос
+    неверен сам по себе (chat not found, user is deactivated, ошибка
+    разметки текста) и на повторе будет тем же.
+    """
+    return isinstance(error, (TelegramForbiddenError, TelegramBadRequest))
+
+
+def retry_delay(attempt: int) -> float:
+    """Пауза перед попыткой ``attempt + 1``: экспонента со случайной
+    половиной, чтобы повторы массового сбоя не приходили разом."""
+    delay = min(REMINDER_RETRY_MAX_SECONDS, REMINDER_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+class TokenBucket:
+    """Корзина токенов: не больше ``rate`` выдач в секунду, всплеск до ``capacity``.
+
+    По умолчанию всплесков нет: токены выдаются равномерно, и за любую
+    секунду уходит не больше ``rate`` сообщений.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = max(0.1, rate)
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ``seconds`` секунд (и обнулить накопленные)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        # Ожидающие встают в очередь на замке: токены выдаются по порядку
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass(slots=True)
+class DispatchStats:
+    """Счётчики диспетчера напоминаний"""
+    sent: int
+    failed: int
+    throttled: int
+    queued: int
+    in_flight: int
+    rate: float
+    marked: int = 0
+    mark_commits: int = 0
+    retried: int = 0
+    dropped: int = 0
+
+    def describe(self) -> str:
+        return (
+            f"отправлено {self.sent}, ошибок {self.failed} (повтор {self.retried}, "
+            f"dead-letter {self.dropped}), RetryAfter {self.throttled}, "
+            f"в очереди {self.queued}, отправляется {self.in_flight}, {self.rate:.1f} сообщ./с, "
+            f"отмечено {self.marked} за {self.mark_commits} записей"
+        )
+
+
+class ReminderDispatcher:
+    """Параллельная отправка напоминаний с учётом лимитов Telegram.
+
+    Напоминания раскладываются по очередям чатов. ``workers`` обработчиков
+    берут чаты из общей очереди готовых; каждое сообщение ждёт токен общей
+    корзины (REMINDER_RATE в секунду), а следующее в тот же чат — не раньше
+    чем через REMINDER_CHAT_INTERVAL. Чат, которому ещё рано, не занимает
+    обработчик: он возвращается в очередь готовых по таймеру.
+
+    На TelegramRetryAfter напоминание возвращается в начало очереди чата, и
+    чат ждёт указанное время. Если в этот чат за последнюю минуту ничего
+    не отправлялось, ограничение общее — на паузу встаёт вся корзина.
+
+    Отправленные напоминания отмечаются в базе пачками через ``mark`` —
+    набралось ``mark_batch`` или прошло ``mark_interval`` секунд. Пока пачка
+    не записана, задача считается отправляемой: повторно она в очередь не
+    встанет, и future вернёт True только после записи.
+
+    Ошибки отправки записываются так же, пачкой через ``fail``: временные —
+    с паузой до следующей попытки (retry_delay, ``on_retry`` сообщает её
+    срок), постоянные (is_permanent) и исчерпавшие REMINDER_MAX_ATTEMPTS —
+    в dead-letter.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[PendingReminder], Awaitable[None]],
+        mark: Callable[[List[int]], Awaitable[int]],
+        fail: Callable[[List[Tuple[int, Optional[int], str]]], Awaitable[int]],
+        on_retry: Optional[Callable[[int, datetime], None]] = None,
+        workers: int = REMINDER_WORKERS,
+        rate: float = REMINDER_RATE,
+        chat_interval: float = REMINDER_CHAT_INTERVAL,
+        mark_batch: int = REMINDER_MARK_BATCH,
+        mark_interval: float = REMINDER_MARK_INTERVAL_MS / 1000
+    ):
+        self.send = send
+        self.mark = mark
+        self.fail = fail
+        self.on_retry = on_retry
+        self.workers = max(1, workers)
+        self.chat_interval = max(0.0, chat_interval)
+        self.mark_batch = max(1, mark_batch)
+        self.mark_interval = max(0.0, mark_interval)
+        self.bucket = TokenBucket(rate)
+        # Очереди чатов и признак того, что чат уже стоит в _ready или ждёт таймера
+        self._chats: Dict[int, Deque[PendingReminder]] = {}
+        self._scheduled: set = set()
+        self._last_sent: Dict[int, float] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        # task_id -> результат отправки (True — отправлено); повторная
+        # постановка той же задачи получает тот же future
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._workers: list = []
+        self._sent_times: Deque[float] = deque()
+        # Отправленные, но ещё не отмеченные в базе
+        self._sent_tasks: List[PendingReminder] = []
+        # Неудачные: (задача, время следующей попытки или None, ошибка)
+        self._failures: List[Tuple[PendingReminder, Optional[int], str]] = []
+        self._has_results: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        # Статистика
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.marked = 0
+        self.mark_commits = 0
+        self.retried = 0
+        self.dropped = 0
+        # Текущая серия: когда началась, сколько в ней отмечено отправленными
+        self._burst_start: Optional[float] = None
+        self._burst_marked = 0
+        self._last_log = 0.0
+
+    @property
+    def queued(self) -> int:
+        """Сколько напоминаний ждёт отправки"""
+        return sum(len(tasks) for tasks in self._chats.values())
+
+    @property
+    def rate(self) -> float:
+        """Отправлено сообщений в секунду за последние RATE_WINDOW_SECONDS"""
+        self._trim_rate(time.monotonic())
+        return len(self._sent_times) / RATE_WINDOW_SECONDS
+
+    def stats(self) -> DispatchStats:
+        return DispatchStats(
+            sent=self.sent,
+            failed=self.failed,
+            throttled=self.throttled,
+            queued=self.queued,
+            in_flight=self.in_flight,
+            rate=self.rate,
+            marked=self.marked,
+            mark_commits=self.mark_commits,
+            retried=self.retried,
+            dropped=self.dropped
+        )
+
+    async def start(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._has_results = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        tasks = list(self._workers)
+        if self._flusher is not None:
+            tasks.append(self._flusher)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        self._flusher = None
+        # Уже отправленное отмечаем, иначе после перезапуска оно уйдёт повторно
+        if self._sent_tasks or self._failures:
+            await self._flush()
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        self._chats.clear()
+        self._scheduled.clear()
+        self._ready = None
+
+    def submit(self, task: PendingReminder) -> asyncio.Future:
+        """Поставить напоминание в очередь; future получит True, если оно отправлено.
+
+        Задача, которая уже в очереди или отправляется, второй раз не ставится.
+        """
+        future = self._pending.get(task.id)
+        if future is not None:
+            return future
+
+        if self._burst_start is None:
+            self._burst_start = self._last_log = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[task.id] = future
+        self._chats.setdefault(task.user_id, deque()).append(task)
+        if task.user_id not in self._scheduled:
+            self._scheduled.add(task.user_id)
+            self._ready_later(task.user_id, self._chat_delay(task.user_id))
+        return future
+
+    def pending_ids(self) -> List[int]:
+        """id задач в очереди, в отправке и ожидающих отметки в базе"""
+        return list(self._pending)
+
+    def discard(self, task_ids: Iterable[int]) -> int:
+        """Убрать из очереди задачи, которые отправлять больше нельзя.
+
+        Уже отправляемые не прерываются. Future убранных получают False.
+
+        Returns:
+            Сколько задач убрано
+        """
+        ids = set(task_ids)
+        dropped = 0
+        for tasks in self._chats.values():
+            keep = [task for task in tasks if task.id not in ids]
+            if len(keep) == len(tasks):
+                continue
+            for task in tasks:
+                if task.id in ids:
+                    self._finish(task, False)
+            dropped += len(tasks) - len(keep)
+            # Тот же deque: обработчик чата может держать ссылку на него
+            tasks.clear()
+            tasks.extend(keep)
+        return dropped
+
+    def _chat_delay(self, chat_id: int) -> float:
+        last = self._last_sent.get(chat_id)
+        if last is None:
+            return 0.0
+        return max(0.0, last + self.chat_interval - time.monotonic())
+
+    def _ready_later(self, chat_id: int, delay: float):
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._make_ready, chat_id)
+        else:
+            self._make_ready(chat_id)
+
+    def _make_ready(self, chat_id: int):
+        if self._ready is not None:
+            self._ready.put_nowait(chat_id)
+
+    def _trim_rate(self, now: float):
+        while self._sent_times and self._sent_times[0] < now - RATE_WINDOW_SECONDS:
+            self._sent_times.popleft()
+
+    def _finish(self, task: PendingReminder, sent: bool):
+        future = self._pending.pop(task.id, None)
+        if future is not None and not future.done():
+            future.set_result(sent)
+
+    async def _flush(self):
+        """Записать в базу пачку отправленных и пачку неудачных задач."""
+        ok = True
+        tasks, self._sent_tasks = self._sent_tasks, []
+        if tasks:
+            try:
+                marked = await self.mark([task.id for task in tasks])
+            except Exception as e:
+                # Вернём в начало пачки: следующая запись повторит попытку
+                print(f"❌ Ошибка отметки отправленных напоминаний ({len(tasks)}): {e}")
+                self._sent_tasks[:0] = tasks
+                ok = False
+            else:
+                self.mark_commits += 1
+                self.marked += marked
+                self._burst_marked += marked
+                for task in tasks:
+                    self._finish(task, True)
+
+        failures, self._failures = self._failures, []
+        if failures:
+            try:
+                await self.fail([
+                    (task.id, next_attempt_at, error) for task, next_attempt_at, error in failures
+                ])
+            except Exception as e:
+                print(f"❌ Ошибка записи неудачных напоминаний ({len(failures)}): {e}")
+                self._failures[:0] = failures
+                ok = False
+            else:
+                for task, next_attempt_at, _ in failures:
+                    self._finish(task, False)
+                    if next_attempt_at is not None and self.on_retry is not None:
+                        self.on_retry(task.id, datetime.fromtimestamp(next_attempt_at))
+        return ok
+
+    def _record_failure(self, task: PendingReminder, error: Exception):
+        attempt = task.attempts + 1
+        if is_permanent(error) or attempt >= REMINDER_MAX_ATTEMPTS:
+            self.dropped += 1
+            next_attempt_at = None
+            print(f"🚫 Напоминание {task.id} не отправлено (попытка {attempt}), в dead-letter: {error}")
+        else:
+            self.retried += 1
+            delay = retry_delay(attempt)
+            next_attempt_at = math.ceil(time.time() + delay)
+            print(f"❌ Ошибка отправки напоминания {task.id} (попытка {attempt}), "
+                  f"повтор через {delay:.0f} с: {error}")
+        self._failures.append((task, next_attempt_at, str(error)[:500]))
+        self._has_results.set()
+        if len(self._failures) + len(self._sent_tasks) >= self.mark_batch:
+            self._batch_full.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._has_results.wait()
+            if len(self._sent_tasks) + len(self._failures) < self.mark_batch:
+                # Даём пачке набраться, но не дольше mark_interval
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.mark_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_results.clear()
+            self._batch_full.clear()
+            if not await self._flush():
+                self._has_results.set()
+                await asyncio.sleep(max(self.mark_interval, 1.0))
+            self._log_stats()
+
+    def _log_stats(self):
+        """Записать статистику после записи пачки: серия закончилась
+        (ничего не осталось в очереди) или с прошлой записи прошло
+        STATS_LOG_INTERVAL_SECONDS."""
+        if self._burst_start is None:
+            return
+        now = time.monotonic()
+        finished = not self._pending
+        if not finished and now - self._last_log < STATS_LOG_INTERVAL_SECONDS:
+            return
+        print(
+            f"📨 Отправлено напоминаний: {self._burst_marked} за {now - self._burst_start:.1f} с; "
+            f"{self.stats().describe()}"
+        )
+        self._last_log = now
+        if finished:
+            self._burst_start = None
+            self._burst_marked = 0
+
+    async def _work(self):
+        while True:
+            chat_id = await self._ready.get()
+            tasks = self._chats.get(chat_id)
+            if not tasks:
+                self._chats.pop(chat_id, None)
+                self._scheduled.discard(chat_id)
+                continue
+
+            task = tasks.popleft()
+            delay = self.chat_interval
+            self.in_flight += 1
+            try:
+                await self.bucket.acquire()
+                previous = self._last_sent.get(chat_id)
+                self._last_sent[chat_id] = time.monotonic()
+                await self.send(task)
+            except TelegramRetryAfter as e:
+                self.throttled += 1
+                tasks.appendleft(task)
+                delay = max(delay, float(e.retry_after))
+                if previous is None or time.monotonic() - previous > CHAT_LIMIT_WINDOW_SECONDS:
+                    # В чат давно не писали — это общий лимит бота
+                    self.bucket.pause(e.retry_after)
+                print(f"⏳ Telegram просит подождать {e.retry_after} с (чат {chat_id})")
+            except asyncio.CancelledError:
+                tasks.appendleft(task)
+                raise
+            except Exception as e:
+                self.failed += 1
+                self._record_failure(task, e)
+            else:
+                self.sent += 1
+                now = time.monotonic()
+                self._sent_times.append(now)
+                self._trim_rate(now)
+                self._sent_tasks.append(task)
+                self._has_results.set()
+                if len(self._sent_tasks) + len(self._failures) >= self.mark_batch:
+                    self._batch_full.set()
+            finally:
+                self.in_flight -= 1
+
+            if tasks:
+                self._ready_later(chat_id, delay)
+            else:
+                self._chats.pop(chat_id, None)
+                self._scheduled.discard(chat_id)
+            # Время последней отправки нужно только в пределах минуты
+            if len(self._last_sent) > 10000:
+                horizon = time.monotonic() - max(self.chat_interval, CHAT_LIMIT_WINDOW_SECONDS)
+                self._last_sent = {
+                    chat: sent_at for chat, sent_at in self._last_sent.items() if sent_at > horizon
+                }
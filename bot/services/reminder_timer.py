@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from database import TaskRepository
+
+
+# На сколько секунд вперёд загружать сроки напоминаний из базы
+REMINDER_WINDOW_SECONDS = float(os.getenv('REMINDER_WINDOW_SECONDS', '300'))
+
+
+class ReminderTimer:
+    """Таймер напоминаний на min-куче сроков.
+
+    Держит в памяти сроки ближайших напоминаний — окно ``window`` секунд
+    вперёд, не больше ``window_limit`` штук — и спит ровно до самого
+    раннего. Новые и изменённые напоминания приходят через schedule() и
+    cancel() (планировщик получает их из outbox task_events) и будят
+    таймер, если срок раньше текущего.
+
+    Куча задаёт только момент: когда срок наступил, вызывается ``on_due``,
+    а что именно отправлять, решает запрос к базе. Окно перечитывается по
+    его окончании — так подбираются напоминания, о которых событий не было
+    (созданные до запуска бота, неотправленные из-за ошибки). Без
+    напоминаний таймер просыпается раз в окно.
+    """
+
+    def __init__(
+        self,
+        on_due: Callable[[], Awaitable[None]],
+        window: float = REMINDER_WINDOW_SECONDS,
+        window_limit: int = 1000
+    ):
+        self.on_due = on_due
+        self.window = max(1.0, window)
+        self.window_limit = max(1, window_limit)
+        # (срок, task_id); запись устарела, если срок в _deadlines другой
+        self._heap: List[Tuple[datetime, int]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._window_end: Optional[datetime] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._calls: Set[asyncio.Task] = set()
+        # Статистика
+        self.fired = 0
+        self.loads = 0
+
+    @property
+    def pending(self) -> int:
+        """Сколько сроков сейчас в памяти"""
+        return len(self._deadlines)
+
+    async def start(self):
+        """Загрузить окно и запустить таймер (просроченные срабатывают сразу)."""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._calls)
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._calls.clear()
+        self._heap = []
+        self._deadlines = {}
+        self._window_end = None
+
+    def schedule(self, task_id: int, remind_at: datetime):
+        """Поставить или перенести срок напоминания задачи."""
+        if self._window_end is not None and remind_at > self._window_end:
+            # Дальше окна — подберёт следующая загрузка
+            self.cancel(task_id)
+            return
+        self._deadlines[task_id] = remind_at
+        heapq.heappush(self._heap, (remind_at, task_id))
+        if self._wake is not None and self._heap[0] == (remind_at, task_id):
+            self._wake.set()
+
+    def cancel(self, task_id: int):
+        """Снять срок задачи (запись в куче удалится, когда дойдёт до вершины)."""
+        self._deadlines.pop(task_id, None)
+
+    def _head(self) -> Optional[datetime]:
+        """Ближайший действующий срок (устаревшие записи выбрасываются)."""
+        while self._heap:
+            deadline, task_id = self._heap[0]
+            if self._deadlines.get(task_id) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    async def _load_window(self):
+        now = datetime.now()
+        self._window_end = now + timedelta(seconds=self.window)
+        self._heap = []
+        self._deadlines = {}
+
+        reminders = await TaskRepository.get_pending_reminders(
+            limit=self.window_limit, until=self._window_end
+        )
+        if len(reminders) >= self.window_limit:
+            # Окно не поместилось целиком — следующая загрузка с последнего
+            # срока, но не чаще раза в секунду, пока разбирается просроченное
+            self._window_end = max(reminders[-1].remind_at, now + timedelta(seconds=1))
+        for reminder in reminders:
+            # Сроки, пришедшие событиями во время запроса, новее
+            if reminder.id not in self._deadlines:
+                self._deadlines[reminder.id] = reminder.due_at
+                self._heap.append((reminder.due_at, reminder.id))
+        heapq.heapify(self._heap)
+        self.loads += 1
+
+    def _fire(self, now: datetime):
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id = heapq.heappop(self._heap)
+            self._deadlines.pop(task_id, None)
+        self.fired += 1
+        # Отправка идёт отдельно: таймер тем временем принимает новые сроки
+        call = asyncio.create_task(self.on_due())
+        self._calls.add(call)
+        call.add_done_callback(self._calls.discard)
+
+    async def _run(self):
+        while True:
+            try:
+                # Сбрасываем до расчёта: schedule() после этого разбудит ожидание
+                self._wake.clear()
+                if self._window_end is None or datetime.now() >= self._window_end:
+                    await self._load_window()
+
+                now = datetime.now()
+                deadline = self._head()
+                if deadline is not None and deadline <= now:
+                    self._fire(now)
+                    continue
+
+                wake_at = min(deadline, self._window_end) if deadline else self._window_end
+                try:
+                    await asyncio.wait_for(self._wake.wait(), (wake_at - now).total_seconds())
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Ошибка таймера напоминаний: {e}")
+                self._window_end = None
+                await asyncio.sleep(1)
@@ -1,20 +1,79 @@
 import asyncio
-from datetime import datetime
-from typing import TYPE_CHECKING
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, List
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from bot.services.reminder_dispatcher import ReminderDispatcher
+from bot.services.reminder_timer import ReminderTimer
 from database import TaskRepository
+from database.backup import backup_database
+from database.cache import task_cache
+from database.maintenance import run_maintenance
+from database.events import TaskEventConsumer
+from database.models import TaskEvent
 
 if TYPE_CHECKING:
     from aiogram import Bot
 
 
 class ReminderScheduler:
-    """Планировщик напоминаний"""
+    """Планировщик напоминаний
+
+    Моменты отправки отсчитывает ReminderTimer (min-куча сроков ближайшего
+    окна). О новых и изменённых напоминаниях он узнаёт из outbox
+    task_events (в том числе о сделанных в API). Отправляет их
+    ReminderDispatcher — параллельно, в пределах лимитов Telegram.
+
+    Экземпляров бота может быть несколько: перед отправкой напоминания
+    захватываются в базе с арендой на CLAIM_LEASE_SECONDS (claim_reminders).
+    Пока задача в очереди диспетчера, аренда продлевается; аренду упавшего
+    экземпляра после истечения перехватывает любой другой.
+
+    Обслуживающие задачи (архив, очистка, резервные копии) — по расписанию
+    APScheduler.
+    """
+
+    # Сколько напоминаний забирать из базы за один запрос
+    BATCH_SIZE = 500
+
+    # Аренда захваченных напоминаний (с): продлевается каждую треть срока,
+    # после истечения задачу может забрать другой экземпляр бота
+    CLAIM_LEASE_SECONDS = float(os.getenv('REMINDER_CLAIM_LEASE_SECONDS', '60'))
+    # Имя экземпляра в claimed_by (по умолчанию хост и pid)
+    INSTANCE_ID = os.getenv('REMINDER_INSTANCE_ID') or f'{socket.gethostname()}:{os.getpid()}'
+
+    # Сколько дней хранить tombstones удалённых задач для дельта-синхронизации
+    TOMBSTONE_TTL_DAYS = int(os.getenv('TOMBSTONE_TTL_DAYS', '30'))
+
+    # Выполненные задачи старше стольких дней переносятся в архив (0 — не переносить)
+    ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '30'))
+    ARCHIVE_BATCH_SIZE = 500
+    # Пауза между порциями архивации, чтобы не занимать писателя надолго
+    ARCHIVE_PAUSE = 0.05
+
+    # Интервал резервного копирования базы в часах (0 — не копировать)
+    BACKUP_INTERVAL_HOURS = float(os.getenv('BACKUP_INTERVAL_HOURS', '24'))
+
+    # Интервал обслуживания базы в часах: статистика и incremental_vacuum (0 — выключить)
+    MAINTENANCE_INTERVAL_HOURS = float(os.getenv('MAINTENANCE_INTERVAL_HOURS', '24'))
     
     def __init__(self, bot: 'Bot'):
         self.bot = bot
         self.scheduler = AsyncIOScheduler()
+        self.events = TaskEventConsumer(self._on_task_events)
+        self.timer = ReminderTimer(self._check_reminders)
+        self.dispatcher = ReminderDispatcher(
+            self._send_reminder,
+            TaskRepository.mark_notified_many,
+            TaskRepository.record_send_failures,
+            on_retry=self.timer.schedule
+        )
+        self.instance_id = self.INSTANCE_ID
+        # Одна проверка за раз: иначе два запуска отправят одно напоминание дважды
+        self._check_lock = asyncio.Lock()
+        self._recheck = False
     
     def start(self):
         """Запустить планировщик"""
@@ -22,13 +81,65 @@ class ReminderScheduler:
         if getattr(self.scheduler, 'running', False):
             return
 
-        # Проверяем напоминания каждые 30 секунд
+        # Продлеваем аренду напоминаний, которые ещё в очереди на отправку
+        self.scheduler.add_job(
+            self._renew_claims,
+            trigger=IntervalTrigger(seconds=max(1.0, self.CLAIM_LEASE_SECONDS / 3)),
+            id='renew_claims',
+            replace_existing=True
+        )
+
+        # Раз в срок аренды проверяем напоминания: так подбираются задачи
+        # упавших экземпляров, чья аренда истекла
         self.scheduler.add_job(
             self._check_reminders,
-            trigger=IntervalTrigger(seconds=30),
-            id='check_reminders',
+            trigger=IntervalTrigger(seconds=max(1.0, self.CLAIM_LEASE_SECONDS)),
+            id='take_over_claims',
+            replace_existing=True
+        )
+
+        # Раз в час чистим старые события outbox
+        self.scheduler.add_job(
+            self._prune_events,
+            trigger=IntervalTrigger(hours=1),
+            id='prune_events',
             replace_existing=True
         )
+
+        # Раз в сутки сжимаем tombstones
+        self.scheduler.add_job(
+            self._compact_tombstones,
+            trigger=IntervalTrigger(days=1),
+            id='compact_tombstones',
+            replace_existing=True
+        )
+
+        # Раз в час переносим давно выполненные задачи в архив
+        if self.ARCHIVE_AFTER_DAYS > 0:
+            self.scheduler.add_job(
+                self._archive_completed,
+                trigger=IntervalTrigger(hours=1),
+                id='archive_completed',
+                replace_existing=True
+            )
+
+        # Резервная копия базы (онлайн, запись не останавливается)
+        if self.BACKUP_INTERVAL_HOURS > 0:
+            self.scheduler.add_job(
+                self._backup,
+                trigger=IntervalTrigger(hours=self.BACKUP_INTERVAL_HOURS),
+                id='backup',
+                replace_existing=True
+            )
+
+        # Обслуживание базы: ANALYZE, PRAGMA optimize, incremental_vacuum порциями
+        if self.MAINTENANCE_INTERVAL_HOURS > 0:
+            self.scheduler.add_job(
+                self._maintenance,
+                trigger=IntervalTrigger(hours=self.MAINTENANCE_INTERVAL_HOURS),
+                id='maintenance',
+                replace_existing=True
+            )
         self.scheduler.start()
         print("⏰ Планировщик напоминаний запущен")
     
@@ -37,42 +148,160 @@ class ReminderScheduler:
         if getattr(self.scheduler, 'running', False):
             self.scheduler.shutdown()
             print("⏰ Планировщик остановлен")
-    
+
+    async def start_listening(self):
+        """Запустить таймер напоминаний и слежение за изменениями задач"""
+        await self.dispatcher.start()
+        await self.events.start()
+        await self.timer.start()
+
+    async def stop_listening(self):
+        await self.events.stop()
+        await self.timer.stop()
+        await self.dispatcher.stop()
+        # Неотправленное сразу достаётся другим экземплярам, без ожидания аренды
+        try:
+            await TaskRepository.release_claims(self.instance_id)
+        except Exception as e:
+            print(f"❌ Ошибка снятия аренды напоминаний: {e}")
+
+    async def _on_task_events(self, events: List[TaskEvent]):
+        """Передать таймеру новые сроки напоминаний (или снять их)
+
+        Заодно сбрасывается кэш пользователей: задачи могли измениться
+        через API, а бот читает их через тот же task_cache.
+        """
+        for user_id in {event.user_id for event in events}:
+            task_cache.invalidate_user(user_id)
+        for event in events:
+            if event.needs_reminder:
+                self.timer.schedule(event.task_id, event.remind_at)
+            else:
+                self.timer.cancel(event.task_id)
+
     async def _check_reminders(self):
         """Проверить и отправить напоминания"""
+        if self._check_lock.locked():
+            # Проверка уже идёт — она повторится, когда закончит
+            self._recheck = True
+            return
+
+        async with self._check_lock:
+            self._recheck = True
+            while self._recheck:
+                self._recheck = False
+                try:
+                    await self._send_due()
+                except Exception as e:
+                    print(f"❌ Ошибка проверки напоминаний: {e}")
+
+    async def _send_due(self):
+        # Забираем напоминания порциями и отдаём диспетчеру. Неполную порцию
+        # не ждём: задачи, которые ещё отправляются или не отмечены, он
+        # повторно не ставит. Полную ждём — иначе следующий запрос вернёт её же.
+        # Итоги отправки пишет в лог сам диспетчер, после записи пачки
+        while True:
+            tasks = await TaskRepository.claim_reminders(
+                self.instance_id, self.CLAIM_LEASE_SECONDS, limit=self.BATCH_SIZE
+            )
+            futures = [self.dispatcher.submit(task) for task in tasks]
+            if len(tasks) < self.BATCH_SIZE:
+                break
+
+            # Ничего не удалось отправить — ждём следующего срока
+            if not any(await asyncio.gather(*futures)):
+                break
+
+    async def _renew_claims(self):
+        """Продлить аренду задач в очереди диспетчера
+
+        Задачи, аренду которых продлить не удалось (её успел перехватить
+        другой экземпляр), из очереди убираются — иначе их отправят дважды.
+        """
+        task_ids = self.dispatcher.pending_ids()
+        if not task_ids:
+            return
         try:
-            # Получаем задачи, которые нужно напомнить
-            tasks = await TaskRepository.get_pending_reminders()
-            
-            for task in tasks:
-                await self._send_reminder(task)
-                
+            renewed = await TaskRepository.renew_claims(
+                self.instance_id, task_ids, self.CLAIM_LEASE_SECONDS
+            )
+            dropped = self.dispatcher.discard(set(task_ids) - set(renewed))
+            if dropped:
+                print(f"⚠️ Аренда потеряна, снято с отправки напоминаний: {dropped}")
+        except Exception as e:
+            print(f"❌ Ошибка продления аренды напоминаний: {e}")
+
+    async def _prune_events(self):
+        """Удалить события outbox старше суток"""
+        try:
+            await TaskRepository.prune_events(older_than_hours=24)
         except Exception as e:
-            print(f"❌ Ошибка проверки напоминаний: {e}")
+            print(f"❌ Ошибка очистки task_events: {e}")
     
-    async def _send_reminder(self, task):
-        """Отправить напоминание пользователю"""
+    async def _archive_completed(self):
+        """Перенести выполненные задачи старше ARCHIVE_AFTER_DAYS в архив"""
         try:
-            category_emoji = {
-                'reminder': '🔔',
-                'task': '✅',
-                'event': '📅'
-            }
-            emoji = category_emoji.get(task.category, '🔔')
-            
-            message = (
-                f"{emoji} **Напоминание!**\n\n"
-                f"{task.text}"
-            )
-            
-            await self.bot.send_message(
-                chat_id=task.user_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-            
-            # Отмечаем как отправленное
-            await TaskRepository.mark_notified(task.id)
-            
+            older_than = datetime.now() - timedelta(days=self.ARCHIVE_AFTER_DAYS)
+            total = 0
+            while True:
+                moved = await TaskRepository.archive_completed(older_than, self.ARCHIVE_BATCH_SIZE)
+                total += moved
+                if moved < self.ARCHIVE_BATCH_SIZE:
+                    break
+                await asyncio.sleep(self.ARCHIVE_PAUSE)
+
+            if total:
+                print(f"🗄 В архив перенесено задач: {total}")
+
         except Exception as e:
-            print(f"❌ Ошибка отправки напоминания {task.id}: {e}")
+            print(f"❌ Ошибка архивации задач: {e}")
+
+    async def _compact_tombstones(self):
+        """Удалить tombstones старше TOMBSTONE_TTL_DAYS"""
+        try:
+            deleted = await TaskRepository.compact_tombstones(self.TOMBSTONE_TTL_DAYS)
+            if deleted:
+                print(f"🪦 Удалено tombstones: {deleted}")
+        except Exception as e:
+            print(f"❌ Ошибка сжатия tombstones: {e}")
+
+    async def _backup(self):
+        """Снять резервную копию базы (см. database.backup)"""
+        try:
+            for result in await backup_database():
+                print(f"💾 Резервная копия {result.describe()}")
+        except Exception as e:
+            print(f"❌ Ошибка резервного копирования: {e}")
+
+    async def _maintenance(self):
+        """Обновить статистику и вернуть свободные страницы (см. database.maintenance)"""
+        try:
+            for result in await run_maintenance():
+                print(f"🧹 Обслуживание базы, {result.describe()}")
+        except Exception as e:
+            print(f"❌ Ошибка обслуживания базы: {e}")
+
+    async def _send_reminder(self, task):
+        """Отправить напоминание пользователю.
+
+        Ошибки обрабатывает диспетчер: RetryAfter — паузой, остальные —
+        повтором с экспоненциальной паузой или dead-letter. Он же пачками
+        отмечает отправленные задачи (mark_notified_many).
+        """
+        category_emoji = {
+            'reminder': '🔔',
+            'task': '✅',
+            'event': '📅'
+        }
+        emoji = category_emoji.get(task.category, '🔔')
+
+        message = (
+            f"{emoji} **Напоминание!**\n\n"
+            f"{task.text}"
+        )
+
+        await self.bot.send_message(
+            chat_id=task.user_id,
+            text=message,
+            parse_mode='Markdown'
+        )
@@ -1,5 +1,5 @@
-from database.connection import get_db, init_db
-from database.models import Task
+from database.connection import get_db, init_db, read_db, write_db
+from database.models import PendingReminder, Task, TaskChanges, TaskPage
 from database.repositories.task_repository import TaskRepository
 
-__all__ = ['get_db', 'init_db', 'Task', 'TaskRepository']
+__all__ = ['get_db', 'init_db', 'read_db', 'write_db', 'Task', 'TaskPage', 'TaskChanges', 'PendingReminder', 'TaskRepository']
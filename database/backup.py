@@ -0,0 +1,168 @@
+import asyncio
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from database.connection import DB_BUSY_TIMEOUT_MS, get_manager, shard_paths
+
+
+# Каталог резервных копий (по умолчанию data/backups рядом с базой)
+BACKUP_DIR = os.getenv('BACKUP_DIR', '')
+# Сколько последних копий каждого файла базы хранить (0 — не удалять)
+BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+# Страниц за один шаг копирования и пауза между шагами (мс)
+BACKUP_PAGES = int(os.getenv('BACKUP_PAGES', '256'))
+BACKUP_PAUSE_MS = float(os.getenv('BACKUP_PAUSE_MS', '5'))
+
+MIB = 1024 * 1024
+
+
+@dataclass(slots=True)
+class BackupResult:
+    """Итог резервной копии одного файла базы"""
+    path: Path
+    pages: int
+    steps: int
+    seconds: float
+    size: int
+    compressed: int
+    # Записи этого процесса во время копирования: число и среднее время (мс);
+    # write_ms_before — среднее время записи до начала копирования
+    writes: int = 0
+    write_ms: Optional[float] = None
+    write_ms_before: Optional[float] = None
+
+    def describe(self) -> str:
+        text = (
+            f"{self.path.name}: {self.pages} стр., "
+            f"{self.size / MIB:.1f} → {self.compressed / MIB:.1f} МиБ "
+            f"за {self.seconds:.2f} с ({self.steps} шагов)"
+        )
+        if self.writes:
+            text += f"; записей во время копии: {self.writes}, в среднем {self.write_ms:.2f} мс"
+            if self.write_ms_before is not None:
+                text += f" (до копии {self.write_ms_before:.2f} мс)"
+        return text
+
+
+def backup_dir() -> Path:
+    return Path(BACKUP_DIR) if BACKUP_DIR else shard_paths()[0].parent / 'backups'
+
+
+def _copy(source_path: Path, target_path: Path, pages: int, pause: float) -> Tuple[int, int]:
+    """Скопировать живую базу онлайн-бэкапом SQLite порциями по ``pages`` страниц.
+
+    Между шагами поток спит ``pause`` секунд и отпускает базу: писатели
+    ждут не дольше одного шага. Открытая читающая транзакция фиксирует
+    снимок WAL — без неё каждый коммит другого подключения перезапускает
+    копирование с начала, и под постоянной записью оно не заканчивается.
+
+    Returns:
+        (страниц в копии, число шагов)
+    """
+    if not source_path.exists():
+        raise FileNotFoundError(source_path)
+
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        time.sleep(pause)
+
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        source.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        source.execute('BEGIN')
+        source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=pages, progress=progress)
+        source.execute('COMMIT')
+        total = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        source.close()
+        target.close()
+    return total, steps
+
+
+def _compress(source_path: Path, target_path: Path):
+    """gzip файла; итоговое имя появляется только у дописанного архива."""
+    part = target_path.with_name(target_path.name + '.part')
+    with open(source_path, 'rb') as src, gzip.open(part, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, MIB)
+    part.replace(target_path)
+
+
+def _rotate(directory: Path, stem: str, keep: int) -> int:
+    """Удалить старые копии файла ``stem``, оставив ``keep`` последних."""
+    if keep <= 0:
+        return 0
+    # Метка времени в имени сортируется как строка
+    backups = sorted(directory.glob(f'{stem}-*.db.gz'))
+    old = backups[:-keep]
+    for path in old:
+        path.unlink(missing_ok=True)
+    return len(old)
+
+
+async def backup_database(
+    pages: int = BACKUP_PAGES,
+    pause_ms: float = BACKUP_PAUSE_MS,
+    keep: int = BACKUP_KEEP
+) -> List[BackupResult]:
+    """Снять сжатую резервную копию каждого шарда, не останавливая запись.
+
+    Копирование и сжатие идут в отдельном потоке; копии складываются в
+    backup_dir() как ``<имя базы>-<дата>-<время>.db.gz``, старые удаляются
+    (остаётся ``keep`` последних).
+
+    Returns:
+        Результаты по шардам — длительность, размеры и время записи
+        этого процесса во время копирования
+    """
+    directory = backup_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+
+    results = []
+    for shard, path in enumerate(shard_paths()):
+        manager = get_manager(shard)
+        writes_before, seconds_before = manager.writes, manager.write_seconds
+
+        target = directory / f'{path.stem}-{stamp}.db.gz'
+        temp = directory / f'{path.stem}-{stamp}.db.tmp'
+        start = time.perf_counter()
+        try:
+            page_count, steps = await asyncio.to_thread(
+                _copy, path, temp, max(1, pages), max(0.0, pause_ms) / 1000
+            )
+            size = temp.stat().st_size
+            await asyncio.to_thread(_compress, temp, target)
+        finally:
+            temp.unlink(missing_ok=True)
+
+        result = BackupResult(
+            path=target,
+            pages=page_count,
+            steps=steps,
+            seconds=time.perf_counter() - start,
+            size=size,
+            compressed=target.stat().st_size
+        )
+        writes = manager.writes - writes_before
+        if writes:
+            result.writes = writes
+            result.write_ms = (manager.write_seconds - seconds_before) / writes * 1000
+        if writes_before:
+            result.write_ms_before = seconds_before / writes_before * 1000
+        results.append(result)
+
+        _rotate(directory, path.stem, keep)
+
+    return results
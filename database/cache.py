@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Set
+
+from database.models import Task, TaskPage
+
+
+# Размер кэша в записях (0 — кэш выключен) и время жизни записи в секундах
+TASK_CACHE_SIZE = int(os.getenv('TASK_CACHE_SIZE', '1000'))
+TASK_CACHE_TTL = float(os.getenv('TASK_CACHE_TTL', '10'))
+
+# Значение-маркер промаха (None — допустимое закэшированное значение)
+MISS = object()
+
+
+def _approx_size(value: Any) -> int:
+    """Приблизительный размер значения в памяти (байт) для статистики."""
+    if isinstance(value, TaskPage):
+        return sys.getsizeof(value) + _approx_size(value.tasks)
+    if isinstance(value, Task):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(getattr(value, name)) for name in Task.__slots__
+        )
+    if isinstance(value, (list, tuple)):
+        # Например, задачи периода (get_range) кэшируются простым списком
+        return sys.getsizeof(value) + sum(_approx_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items()
+        )
+    return sys.getsizeof(value)
+
+
+class TaskCache:
+    """LRU-кэш с TTL для чтений TaskRepository внутри процесса.
+
+    Ключ записи — кортеж, первым элементом которого идёт user_id: так
+    изменение задач пользователя сбрасывает ровно его записи. TTL
+    ограничивает устаревание при изменениях из другого процесса (бот и API
+    работают раздельно и про записи друг друга узнают только по TTL).
+
+    Гонка "чтение началось до записи, а в кэш попало после неё" закрыта
+    счётчиком поколений: ``generation()`` запоминается до запроса к БД, и
+    ``set()`` отбрасывает значение, если с тех пор была инвалидация.
+    """
+
+    def __init__(self, max_entries: int = TASK_CACHE_SIZE, ttl: float = TASK_CACHE_TTL):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        # key -> (expires_at, size, value)
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self._by_user: Dict[Hashable, Set[tuple]] = {}
+        self._generation = 0
+        self._bytes = 0
+        # Статистика для подбора размера и TTL
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def generation(self) -> int:
+        """Текущее поколение — передать в set() после чтения из БД."""
+        return self._generation
+
+    def get(self, key: tuple) -> Any:
+        """Значение по ключу или MISS."""
+        if not self.enabled:
+            return MISS
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISS
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return MISS
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key: tuple, value: Any, generation: int):
+        """Сохранить значение, прочитанное в поколении ``generation``."""
+        if not self.enabled or generation != self._generation:
+            return
+        if key in self._entries:
+            self._remove(key)
+        size = _approx_size(value)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._by_user.setdefault(key[0], set()).add(key)
+        self._bytes += size
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate_user(self, user_id: Hashable):
+        """Сбросить все записи пользователя (после изменения его задач)."""
+        self._generation += 1
+        self.invalidations += 1
+        for key in self._by_user.pop(user_id, ()):
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._by_user.clear()
+        self._bytes = 0
+
+    def _remove(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def stats(self) -> dict:
+        """Статистика: попадания, промахи, доля попаданий, размер."""
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'users': len(self._by_user),
+            'approx_bytes': self._bytes,
+            'ttl_seconds': self.ttl,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+# Один кэш на процесс
+task_cache = TaskCache()
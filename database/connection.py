@@ -1,118 +1,424 @@
+import asyncio
+import os
+import time
+import zlib
 import aiosqlite
 import sqlite3
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, List, Optional
+
+from database import models
+from database.migrations import run_migrations
+from database.migrations.m0004_epoch_timestamps import VERSION as EPOCH_MIGRATION
+from database.write_queue import WriteOp, WriteQueue
 
 # Путь к файлу базы данных
 DB_PATH = Path(__file__).parent.parent / "data" / "taskbot.db"
 
-# Один общий асинхронный коннекшн для приложения.
-# Используем единый объект, чтобы избежать повторного старта фоновых потоков
+# Число шардов: задачи пользователя хранятся в файле, выбранном по хешу
+# user_id (см. shard_for_user). 1 — один файл DB_PATH, как раньше.
+# Меняется только на пустой базе: перераспределения данных нет.
+DB_SHARDS = max(1, int(os.getenv('DB_SHARDS', '1')))
+
+# id задач шарда k начинаются с k << SHARD_ID_BITS: id остаются уникальными
+# между шардами, а шард задачи определяется по её id
+SHARD_ID_BITS = 40
+
+# Размер пула читающих подключений (WAL позволяет читать параллельно с записью)
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', '4'))
+
+# Сколько ждать освобождения блокировки записи другим процессом (бот и API
+# работают с одним файлом), прежде чем получить "database is locked".
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+
+# Групповой коммит: изменения, пришедшие в течение окна, фиксируются одной
+# транзакцией (см. WriteQueue). По умолчанию выключен.
+DB_WRITE_QUEUE: bool = os.getenv('DB_WRITE_QUEUE', 'false').lower() in ('true', '1', 'yes')
+DB_WRITE_QUEUE_WINDOW_MS = float(os.getenv('DB_WRITE_QUEUE_WINDOW_MS', '5'))
+DB_WRITE_QUEUE_MAX_BATCH = int(os.getenv('DB_WRITE_QUEUE_MAX_BATCH', '64'))
+
+
+class ConnectionManager:
+    """Менеджер подключений к SQLite: один писатель и пул читателей.
+
+    База переводится в режим WAL, поэтому читатели не блокируются записью
+    и не блокируют её. Все изменения идут через единственное подключение
+    писателя под asyncio.Lock, чтобы транзакции не перемешивались. Чтения
+    берут свободное подключение из пула (до ``read_pool_size`` штук), так что
+    медленный SELECT не встаёт в очередь потока aiosqlite перед INSERT/UPDATE.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        read_pool_size: int = DB_READ_POOL_SIZE,
+        write_queue: bool = DB_WRITE_QUEUE
+    ):
+        self.path = path
+        self.read_pool_size = max(1, read_pool_size)
+        self.write_queue: Optional[WriteQueue] = None
+        if write_queue:
+            self.write_queue = WriteQueue(
+                self,
+                window_ms=DB_WRITE_QUEUE_WINDOW_MS,
+                max_batch=DB_WRITE_QUEUE_MAX_BATCH
+            )
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._idle_readers: Optional[asyncio.Queue] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._open_lock: Optional[asyncio.Lock] = None
+        # Статистика записи: число операций и суммарное время с ожиданием
+        # писателя (по ней видно, насколько фоновые задачи замедляют запись)
+        self.writes = 0
+        self.write_seconds = 0.0
+
+    def _locks(self):
+        # asyncio-примитивы создаём лениво — уже внутри работающего event loop
+        if self._open_lock is None:
+            self._open_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+            self._idle_readers = asyncio.Queue()
+        return self._open_lock
+
+    async def _connect(self, readonly: bool = False) -> aiosqlite.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = await aiosqlite.connect(self.path)
+        await conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        if readonly:
+            await conn.execute('PRAGMA query_only = ON')
+        else:
+            await conn.execute('PRAGMA journal_mode = WAL')
+            # В WAL режим NORMAL не грозит порчей файла и убирает fsync на каждый коммит
+            await conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    async def get_writer(self) -> aiosqlite.Connection:
+        """Подключение писателя (открывается при первом обращении)."""
+        async with self._locks():
+            if self._writer is None:
+                self._writer = await self._connect()
+        return self._writer
+
+    @asynccontextmanager
+    async def write(self):
+        """Эксклюзивный доступ к писателю на время одной транзакции.
+
+        Коммит выполняет вызывающий код; при исключении транзакция откатывается.
+        """
+        db = await self.get_writer()
+        async with self._write_lock:
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+
+    async def run_write(self, op: WriteOp) -> Any:
+        """Выполнить операцию записи и зафиксировать её.
+
+        В режиме очереди операция попадает в ближайший групповой коммит,
+        иначе выполняется и коммитится сразу под блокировкой писателя.
+        """
+        start = time.perf_counter()
+        try:
+            if self.write_queue is not None:
+                return await self.write_queue.submit(op)
+            async with self.write() as db:
+                result = await op(db)
+                await db.commit()
+                return result
+        finally:
+            self.writes += 1
+            self.write_seconds += time.perf_counter() - start
+
+    async def _acquire_reader(self) -> aiosqlite.Connection:
+        async with self._locks():
+            if self._idle_readers.empty() and len(self._readers) < self.read_pool_size:
+                # Писатель открываем первым — он переводит файл в WAL
+                if self._writer is None:
+                    self._writer = await self._connect()
+                conn = await self._connect(readonly=True)
+                self._readers.append(conn)
+                return conn
+        return await self._idle_readers.get()
+
+    async def open_reader(self) -> aiosqlite.Connection:
+        """Отдельное читающее подключение вне пула (закрывает вызывающий код).
+
+        Нужно тем, кто держит подключение долго, — например, чтобы следить
+        за ``PRAGMA data_version``: оно меняется только для одного и того же
+        подключения, когда коммит сделало любое другое.
+        """
+        return await self._connect(readonly=True)
+
+    @asynccontextmanager
+    async def read(self):
+        """Взять подключение из пула читателей на время запроса."""
+        conn = await self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn in self._readers:
+                self._idle_readers.put_nowait(conn)
+            else:
+                # Пул закрыли, пока подключение было занято, — закрываем его здесь
+                await conn.close()
+
+    async def close(self):
+        """Закрыть писателя и все подключения пула.
+
+        Занятые читатели не прерываются: их закроет ``read()``, когда
+        запрос вернёт подключение.
+        """
+        if self.write_queue is not None:
+            await self.write_queue.stop()
+        conns = []
+        while self._idle_readers is not None and not self._idle_readers.empty():
+            conns.append(self._idle_readers.get_nowait())
+        if self._writer is not None:
+            conns.append(self._writer)
+        self._readers = []
+        self._writer = None
+        self._open_lock = None
+        self._write_lock = None
+        self._idle_readers = None
+        for conn in conns:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+
+
+# Менеджеры подключений процесса — по одному на шард.
+# Используем единые объекты, чтобы избежать повторного старта фоновых потоков
 # внутри aiosqlite при многократных подключениях / перезапусках кода.
-_DB_CONN: Optional[aiosqlite.Connection] = None
+_MANAGERS: List[Optional[ConnectionManager]] = []
+
+
+def shard_paths() -> List[Path]:
+    """Файлы шардов: DB_PATH при одном шарде, иначе taskbot.shard<k>.db рядом с ним."""
+    if DB_SHARDS == 1:
+        return [DB_PATH]
+    return [DB_PATH.with_name(f'{DB_PATH.stem}.shard{k}{DB_PATH.suffix}') for k in range(DB_SHARDS)]
+
+
+def shard_for_user(user_id: int) -> int:
+    """Шард пользователя (стабильный хеш — не зависит от процесса и версии Python)."""
+    if DB_SHARDS == 1:
+        return 0
+    return zlib.crc32(str(user_id).encode()) % DB_SHARDS
+
+
+def shard_for_task(task_id: int) -> int:
+    """Шард задачи по её id."""
+    return task_id >> SHARD_ID_BITS
+
+
+def get_manager(shard: int = 0) -> ConnectionManager:
+    """Получить менеджер подключений шарда (создаётся при первом вызове)."""
+    if not _MANAGERS:
+        _MANAGERS.extend([None] * DB_SHARDS)
+    if _MANAGERS[shard] is None:
+        _MANAGERS[shard] = ConnectionManager(shard_paths()[shard])
+    return _MANAGERS[shard]
 
 
 async def init_db_connection():
-    """Инициализировать и сохранить глобальное асинхронное подключение.
+    """Инициализировать менеджеры подключений и открыть подключения писателей.
 
     Вызывать один раз при старте приложения (после создания файла/таблиц).
     """
-    global _DB_CONN
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if _DB_CONN is None:
-        _DB_CONN = await aiosqlite.connect(DB_PATH)
-    return _DB_CONN
+    for shard in range(DB_SHARDS):
+        await get_manager(shard).get_writer()
 
 
 async def get_db():
-    """Получить асинхронное подключение к базе данных (единственный экземпляр).
+    """Получить подключение писателя (единственный экземпляр, шард 0).
+
+    Оставлено для совместимости: новый код должен использовать
+    ``read_db()`` для чтения и ``write_db()`` для изменений.
+    """
+    return await get_manager().get_writer()
 
-    Если соединение ещё не инициализировано — создаётся новый.
-    Возвращаем объект подключения (не контекстный менеджер).
+
+def read_db(shard: int = 0):
+    """Контекстный менеджер: подключение из пула читателей шарда.
+
+    Использование::
+
+        async with read_db(shard_for_user(user_id)) as db:
+            cursor = await db.execute('SELECT ...')
     """
-    global _DB_CONN
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if _DB_CONN is None:
-        _DB_CONN = await aiosqlite.connect(DB_PATH)
-    return _DB_CONN
+    return get_manager(shard).read()
+
+
+@asynccontextmanager
+async def read_snapshot(shard: int = 0):
+    """Читатель шарда внутри одной читающей транзакции.
+
+    Все запросы внутри видят один и тот же снимок WAL — нужно, когда
+    несколько SELECT должны согласоваться между собой (версия и строки).
+    """
+    async with read_db(shard) as db:
+        await db.execute('BEGIN')
+        try:
+            yield db
+        finally:
+            # Читающая транзакция ничего не меняет: откат просто её закрывает
+            await db.rollback()
+
+
+def write_db(shard: int = 0):
+    """Контекстный менеджер: эксклюзивное подключение писателя шарда."""
+    return get_manager(shard).write()
+
+
+async def run_write(op: WriteOp, shard: int = 0) -> Any:
+    """Выполнить операцию записи в шарде (с групповым коммитом, если включён).
+
+    Операция не должна вызывать commit сама::
+
+        async def op(db):
+            cursor = await db.execute('UPDATE ...', params)
+            return cursor.rowcount
+
+        rowcount = await run_write(op, shard_for_user(user_id))
+    """
+    return await get_manager(shard).run_write(op)
 
 
 async def init_db():
-    """Инициализация базы данных — создание таблиц.
+    """Инициализация базы данных — применение миграций схемы в каждом шарде.
 
     Для инициализации используем синхронный sqlite3, чтобы избежать проблем
     с запуском фоновых потоков в aiosqlite при старте приложения (uvicorn --reload).
-    После инициализации обычные операции в коде могут использовать aiosqlite через get_db().
+    После инициализации обычные операции в коде используют aiosqlite через read_db()/write_db().
+    Уже применённые миграции пропускаются (см. database.migrations).
     """
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    _check_layout()
+    _resolve_timestamp_format()
 
-    # Используем синхронный sqlite3 для создания таблиц (без фоновых потоков)
-    conn = sqlite3.connect(DB_PATH)
-    try:
-        cur = conn.cursor()
-        cur.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                text TEXT NOT NULL,
-                category TEXT DEFAULT 'reminder',
-                event_at TIMESTAMP,
-                remind_at TIMESTAMP,
-                reminder_offset_minutes INTEGER,
-                completed BOOLEAN DEFAULT FALSE,
-                notified BOOLEAN DEFAULT FALSE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+    applied = []
+    for shard, path in enumerate(shard_paths()):
+        path.parent.mkdir(parents=True, exist_ok=True)
 
-        cur.execute('''
-            CREATE INDEX IF NOT EXISTS idx_tasks_user_id 
-            ON tasks(user_id)
-        ''')
-
-        cur.execute('''
-            CREATE INDEX IF NOT EXISTS idx_tasks_remind 
-            ON tasks(remind_at, completed, notified)
-        ''')
+        # Транзакциями управляет раннер миграций
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+            # WAL сохраняется в файле базы: читатели не ждут писателя
+            conn.execute('PRAGMA journal_mode = WAL')
+            applied.extend(run_migrations(conn))
+            _init_shard(conn, shard)
+        finally:
+            conn.close()
 
-        conn.commit()
+    if applied:
+        print(f"✅ База данных обновлена до версии {max(applied)}")
+    else:
         print("✅ База данных инициализирована")
+    if DB_SHARDS > 1:
+        print(f"🗂 Шардов: {DB_SHARDS}")
+
+
+def _recorded_versions(path: Path) -> set:
+    """Версии миграций, записанные в файле базы (без создания таблиц)."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+        ).fetchone()
+        if not exists:
+            return set()
+        return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
     finally:
         conn.close()
 
-    # Попробуем мягко добавить новые колонки в существующую базу (если обновляем старую схему)
+
+def _resolve_timestamp_format():
+    """Взять формат временных меток из базы, а не из окружения процесса.
+
+    Если хоть один шард уже переведён в epoch (m0004 записана), процесс
+    пишет epoch при любом DB_TIMESTAMP_FORMAT: ISO-строка рядом с числами
+    сортируется после всех чисел, и сравнения по времени ломаются.
+    Остальные шарды m0004 тогда доконвертирует при применении миграций.
+    """
+    migrated = any(
+        EPOCH_MIGRATION in _recorded_versions(path)
+        for path in shard_paths() if path.exists()
+    )
+    if migrated and models.DB_TIMESTAMP_FORMAT != 'epoch':
+        print(f"⚠️ DB_TIMESTAMP_FORMAT={models.DB_TIMESTAMP_FORMAT}, но база уже в epoch — используется epoch")
+        models.set_timestamp_format('epoch')
+
+
+def _has_tasks(path: Path) -> bool:
+    """Есть ли в файле базы задачи (активные или архивные)."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        # Проверяем наличие столбца event_at
-        cur.execute("PRAGMA table_info(tasks)")
-        cols = [r[1] for r in cur.fetchall()]
-        if 'event_at' not in cols:
-            try:
-                cur.execute('ALTER TABLE tasks ADD COLUMN event_at TIMESTAMP')
-            except Exception:
-                pass
-        if 'reminder_offset_minutes' not in cols:
-            try:
-                cur.execute('ALTER TABLE tasks ADD COLUMN reminder_offset_minutes INTEGER')
-            except Exception:
-                pass
-        conn.commit()
-    except Exception:
-        pass
+        tables = {
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('tasks', 'tasks_archive')"
+            )
+        }
+        return any(conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() for table in tables)
     finally:
-        try:
-            conn.close()
-        except Exception:
-            pass
+        conn.close()
+
+
+def _check_layout():
+    """Не стартовать, если задачи лежат в файлах другой раскладки шардов.
+
+    Смена DB_SHARDS без перераспределения данных молча «теряет» задачи:
+    при DB_SHARDS > 1 не читается DB_PATH, при DB_SHARDS == 1 — файлы шардов.
+    """
+    current = set(shard_paths())
+    candidates = [DB_PATH, *DB_PATH.parent.glob(f'{DB_PATH.stem}.shard*{DB_PATH.suffix}')]
+    stale = [path for path in candidates if path not in current and path.exists() and _has_tasks(path)]
+    if stale:
+        raise RuntimeError(
+            f"DB_SHARDS={DB_SHARDS}, но задачи есть в {', '.join(p.name for p in stale)}: "
+            f"данные нужно перераспределить"
+        )
+
+
+def _init_shard(conn: sqlite3.Connection, shard: int):
+    """Проверить, что файл принадлежит этому шарду, и сдвинуть счётчик id задач."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS shard_info (shard INTEGER NOT NULL, shards INTEGER NOT NULL)'
+        )
+        row = conn.execute('SELECT shard, shards FROM shard_info').fetchone()
+        if row is None:
+            conn.execute('INSERT INTO shard_info (shard, shards) VALUES (?, ?)', (shard, DB_SHARDS))
+        elif row != (shard, DB_SHARDS):
+            raise RuntimeError(
+                f"Файл шарда {shard} создан как шард {row[0]} из {row[1]}, "
+                f"а DB_SHARDS={DB_SHARDS}: данные нужно перераспределить"
+            )
+
+        # AUTOINCREMENT берёт следующий id из sqlite_sequence
+        base = shard << SHARD_ID_BITS
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tasks'").fetchone()
+        if seq is None:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('tasks', ?)", (base,))
+        elif seq[0] < base:
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'tasks'", (base,))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
 
 
 async def close_db_connection():
-    """Закрыть глобальное асинхронное подключение, если оно открыто."""
-    global _DB_CONN
-    if _DB_CONN is not None:
+    """Закрыть все подключения процесса, если они открыты."""
+    managers = [m for m in _MANAGERS if m is not None]
+    _MANAGERS.clear()
+    for manager in managers:
         try:
-            await _DB_CONN.close()
-        finally:
-            _DB_CONN = None
+            await manager.close()
+        except Exception:
+            pass
@@ -0,0 +1,98 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional
+
+import aiosqlite
+
+from database.connection import DB_SHARDS, get_manager
+from database.models import TaskEvent
+from database.repositories.task_repository import TaskRepository
+
+
+# Как часто проверять, не было ли новых коммитов (PRAGMA data_version)
+TASK_EVENTS_POLL_MS = float(os.getenv('TASK_EVENTS_POLL_MS', '50'))
+
+# Обработчик пачки событий одного шарда
+EventHandler = Callable[[List[TaskEvent]], Awaitable[None]]
+
+
+class TaskEventConsumer:
+    """Читатель outbox task_events: следует за журналом по возрастанию id.
+
+    Каждые ``poll_ms`` миллисекунд проверяет ``PRAGMA data_version`` на
+    своём отдельном подключении к каждому шарду — это не читает таблицы и
+    почти ничего не стоит. Значение меняется, только когда коммит сделало
+    другое подключение (в том числе другой процесс), и лишь тогда
+    выбираются события с id больше последнего обработанного.
+
+    Чтение начинается с конца журнала: всё, что было до старта,
+    вызывающий код подбирает сам (например, планировщик — обычным опросом).
+    """
+
+    def __init__(self, handler: EventHandler, poll_ms: float = TASK_EVENTS_POLL_MS, batch_size: int = 500):
+        self.handler = handler
+        self.poll = max(1.0, poll_ms) / 1000
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._conns: List[aiosqlite.Connection] = []
+        self._last_ids: List[int] = []
+        self._versions: List[Optional[int]] = []
+        # Статистика
+        self.events = 0
+
+    async def start(self):
+        """Запомнить текущий конец журнала и запустить фоновое чтение."""
+        if self._task is not None:
+            return
+        for shard in range(DB_SHARDS):
+            self._conns.append(await get_manager(shard).open_reader())
+            self._last_ids.append(await TaskRepository.last_event_id(shard))
+            self._versions.append(None)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for conn in self._conns:
+            try:
+                await conn.close()
+            except Exception:
+                pass
+        self._conns = []
+        self._last_ids = []
+        self._versions = []
+
+    async def _run(self):
+        while True:
+            for shard, conn in enumerate(self._conns):
+                try:
+                    await self._poll_shard(shard, conn)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Ошибка чтения task_events (шард {shard}): {e}")
+            await asyncio.sleep(self.poll)
+
+    async def _poll_shard(self, shard: int, conn: aiosqlite.Connection):
+        cursor = await conn.execute('PRAGMA data_version')
+        version = (await cursor.fetchone())[0]
+        if version == self._versions[shard]:
+            return
+
+        while True:
+            events = await TaskRepository.get_events(shard, self._last_ids[shard], self.batch_size)
+            if not events:
+                break
+            await self.handler(events)
+            self._last_ids[shard] = events[-1].id
+            self.events += len(events)
+            if len(events) < self.batch_size:
+                break
+        # Версию запоминаем после обработки: если обработчик упал,
+        # на следующем тике попробуем снова
+        self._versions[shard] = version
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List
+
+from database.connection import DB_BUSY_TIMEOUT_MS, DB_SHARDS, read_db, run_write, shard_paths
+
+
+# Строк на индекс, которые просматривает ANALYZE (0 — все строки)
+MAINTENANCE_ANALYSIS_LIMIT = int(os.getenv('MAINTENANCE_ANALYSIS_LIMIT', '1000'))
+# Страниц, освобождаемых за один шаг incremental_vacuum, и пауза между шагами (мс)
+MAINTENANCE_VACUUM_PAGES = int(os.getenv('MAINTENANCE_VACUUM_PAGES', '500'))
+MAINTENANCE_PAUSE_MS = float(os.getenv('MAINTENANCE_PAUSE_MS', '20'))
+# Не больше стольких страниц за один запуск (остальное — в следующий раз)
+MAINTENANCE_MAX_PAGES = int(os.getenv('MAINTENANCE_MAX_PAGES', '50000'))
+
+
+@dataclass(slots=True)
+class MaintenanceResult:
+    """Итог обслуживания одного шарда"""
+    shard: int
+    pages_before: int
+    pages_after: int
+    freelist_before: int
+    freelist_after: int
+    analyze_seconds: float
+    vacuum_seconds: float
+    vacuum_steps: int
+
+    @property
+    def reclaimed(self) -> int:
+        return self.freelist_before - self.freelist_after
+
+    def describe(self) -> str:
+        return (
+            f"шард {self.shard}: статистика за {self.analyze_seconds:.2f} с, "
+            f"освобождено {self.reclaimed} стр. за {self.vacuum_seconds:.2f} с "
+            f"({self.vacuum_steps} шагов), страниц {self.pages_before} → {self.pages_after}, "
+            f"свободных осталось {self.freelist_after}"
+        )
+
+
+@dataclass(slots=True)
+class VacuumResult:
+    """Итог перевода шарда в auto_vacuum = INCREMENTAL"""
+    shard: int
+    converted: bool
+    seconds: float
+    pages_before: int
+    pages_after: int
+
+    def describe(self) -> str:
+        if not self.converted:
+            return f"шард {self.shard}: уже INCREMENTAL"
+        return (
+            f"шард {self.shard}: переведён в INCREMENTAL за {self.seconds:.1f} с, "
+            f"страниц {self.pages_before} → {self.pages_after}"
+        )
+
+
+def enable_incremental_vacuum(busy_timeout_ms: int = 60_000) -> List[VacuumResult]:
+    """Перевести существующие шарды в auto_vacuum = INCREMENTAL полным VACUUM.
+
+    Разовая операция (``python run.py vacuum``): на время перестройки файла
+    запись в шард заблокирована, поэтому при старте её не делают (см.
+    миграцию 10). Можно запускать при работающих боте и API — VACUUM
+    ждёт до ``busy_timeout_ms`` освобождения базы, а их запросы в это
+    время ждут его.
+    """
+    results = []
+    for shard, path in enumerate(shard_paths()):
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            conn.execute(f'PRAGMA busy_timeout = {max(busy_timeout_ms, DB_BUSY_TIMEOUT_MS)}')
+            pages_before = conn.execute('PRAGMA page_count').fetchone()[0]
+            converted = conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2
+            start = time.perf_counter()
+            if converted:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            results.append(VacuumResult(
+                shard=shard,
+                converted=converted,
+                seconds=time.perf_counter() - start,
+                pages_before=pages_before,
+                pages_after=conn.execute('PRAGMA page_count').fetchone()[0]
+            ))
+        finally:
+            conn.close()
+    return results
+
+
+async def _page_counts(shard: int):
+    async with read_db(shard) as db:
+        cursor = await db.execute('PRAGMA page_count')
+        pages = (await cursor.fetchone())[0]
+        cursor = await db.execute('PRAGMA freelist_count')
+        freelist = (await cursor.fetchone())[0]
+    return pages, freelist
+
+
+async def _refresh_statistics(db):
+    # analysis_limit ограничивает ANALYZE примерной статистикой: на больших
+    # таблицах он не держит писателя долго. optimize после него дообновляет
+    # то, что планировщик запросов отметил как устаревшее.
+    await db.execute(f'PRAGMA analysis_limit = {max(0, MAINTENANCE_ANALYSIS_LIMIT)}')
+    await db.execute('ANALYZE')
+    await db.execute('PRAGMA optimize')
+
+
+async def _vacuum_step(db) -> int:
+    # incremental_vacuum освобождает по странице на каждый sqlite3_step, а
+    # модуль sqlite3 у запроса без результата делает только один шаг —
+    # поэтому одна страница на выполнение, N выполнений одним вызовом
+    await db.executemany('PRAGMA incremental_vacuum(1)', [()] * max(1, MAINTENANCE_VACUUM_PAGES))
+    cursor = await db.execute('PRAGMA freelist_count')
+    return (await cursor.fetchone())[0]
+
+
+async def maintain_shard(shard: int) -> MaintenanceResult:
+    """Обновить статистику планировщика и вернуть свободные страницы шарда.
+
+    Каждый шаг — отдельная короткая запись через run_write, между шагами
+    пауза: обычные изменения задач успевают пройти между ними. Свободные
+    страницы освобождаются только в базе с auto_vacuum = INCREMENTAL
+    (миграция 10); за запуск — не больше MAINTENANCE_MAX_PAGES.
+    """
+    pages_before, freelist_before = await _page_counts(shard)
+
+    start = time.perf_counter()
+    await run_write(_refresh_statistics, shard)
+    analyze_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    steps = 0
+    freelist = freelist_before
+    budget = max(0, MAINTENANCE_MAX_PAGES)
+    while freelist > 0 and budget > 0:
+        left = await run_write(_vacuum_step, shard)
+        steps += 1
+        budget -= freelist - left
+        if left >= freelist:
+            # Ничего не освободилось (auto_vacuum не INCREMENTAL)
+            print(f"⚠️ Шард {shard}: auto_vacuum не INCREMENTAL, выполните `python run.py vacuum`")
+            break
+        freelist = left
+        await asyncio.sleep(MAINTENANCE_PAUSE_MS / 1000)
+    vacuum_seconds = time.perf_counter() - start
+
+    pages_after, freelist_after = await _page_counts(shard)
+    return MaintenanceResult(
+        shard=shard,
+        pages_before=pages_before,
+        pages_after=pages_after,
+        freelist_before=freelist_before,
+        freelist_after=freelist_after,
+        analyze_seconds=analyze_seconds,
+        vacuum_seconds=vacuum_seconds,
+        vacuum_steps=steps
+    )
+
+
+async def run_maintenance() -> List[MaintenanceResult]:
+    """Обслужить все шарды по очереди."""
+    return [await maintain_shard(shard) for shard in range(DB_SHARDS)]
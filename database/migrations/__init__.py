@@ -0,0 +1,186 @@
+"""Версионированные миграции схемы базы данных.
+
+Каждая миграция — отдельный модуль ``mNNNN_<название>.py`` в этом пакете:
+
+    VERSION = 5
+    DESCRIPTION = 'Что делает миграция'
+
+    def upgrade(conn: sqlite3.Connection):
+        conn.execute('ALTER TABLE ...')
+
+Миграции применяются по возрастанию VERSION, применённые записываются в
+таблицу schema_version и при следующих запусках пропускаются.
+
+Обычная миграция выполняется целиком в одной транзакции вместе с записью
+версии. Большие миграции данных пишутся генератором: после каждой порции
+строк ``upgrade`` делает ``yield``, раннер коммитит порцию и снова берёт
+блокировку на следующую. Так запись не блокируется на минуты, а прерванная
+миграция продолжится с того места, где остановилась (порции должны сами
+пропускать уже обработанные строки).
+
+Необязательная функция ``enabled() -> bool`` позволяет сделать миграцию
+включаемой по настройке: пока она выключена, версия не записывается.
+
+Команды, которые нельзя выполнять в транзакции (VACUUM), пишутся в
+миграции с ``TRANSACTION = False``: раннер вызывает ``upgrade`` вне
+транзакции и только потом записывает версию, поэтому такая миграция
+должна быть идемпотентной.
+"""
+
+import importlib
+import inspect
+import pkgutil
+import sqlite3
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Callable, List, Optional
+
+
+@dataclass(slots=True)
+class Migration:
+    """Описание одной миграции"""
+    version: int
+    description: str
+    upgrade: Callable[[sqlite3.Connection], object]
+    enabled: Optional[Callable[[], bool]] = None
+    transaction: bool = True
+
+    @classmethod
+    def from_module(cls, module: ModuleType) -> 'Migration':
+        return cls(
+            version=module.VERSION,
+            description=module.DESCRIPTION,
+            upgrade=module.upgrade,
+            enabled=getattr(module, 'enabled', None),
+            transaction=getattr(module, 'TRANSACTION', True)
+        )
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.enabled is None or self.enabled()
+
+
+def load_migrations() -> List[Migration]:
+    """Найти все модули миграций пакета и отсортировать по версии"""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith('m'):
+            continue
+        module = importlib.import_module(f'{__name__}.{info.name}')
+        migrations.append(Migration.from_module(module))
+
+    migrations.sort(key=lambda m: m.version)
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Повторяющиеся версии миграций: {versions}")
+    return migrations
+
+
+MIGRATIONS: List[Migration] = load_migrations()
+
+
+def applied_versions(conn: sqlite3.Connection) -> set:
+    """Версии, уже применённые к базе"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Применить недостающие миграции.
+
+    ``conn`` должен быть открыт с ``isolation_level=None`` — транзакциями
+    управляет раннер. Bot и API могут стартовать одновременно, поэтому
+    каждая миграция берёт BEGIN IMMEDIATE и перепроверяет версию уже под
+    блокировкой записи.
+
+    Returns:
+        Список применённых в этот раз версий
+    """
+    applied = applied_versions(conn)
+    pending = [m for m in MIGRATIONS if m.version not in applied and m.is_enabled]
+    done = []
+
+    for migration in pending:
+        if not migration.transaction:
+            if not _run_outside_transaction(conn, migration):
+                continue
+        elif inspect.isgeneratorfunction(migration.upgrade):
+            if not _run_chunked(conn, migration):
+                continue
+        else:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if _is_applied(conn, migration.version):
+                    conn.execute('ROLLBACK')
+                    continue
+                migration.upgrade(conn)
+                _record(conn, migration)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        done.append(migration.version)
+        print(f"🔧 Миграция {migration.version}: {migration.description}")
+
+    return done
+
+
+def _run_chunked(conn: sqlite3.Connection, migration: Migration) -> bool:
+    """Выполнить миграцию-генератор: одна порция — одна транзакция."""
+    steps = migration.upgrade(conn)
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if _is_applied(conn, migration.version):
+                conn.execute('ROLLBACK')
+                steps.close()
+                return False
+            try:
+                next(steps)
+            except StopIteration:
+                _record(conn, migration)
+                conn.execute('COMMIT')
+                return True
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def _run_outside_transaction(conn: sqlite3.Connection, migration: Migration) -> bool:
+    """Выполнить миграцию без транзакции, затем записать версию."""
+    if _is_applied(conn, migration.version):
+        return False
+    migration.upgrade(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if _is_applied(conn, migration.version):
+            conn.execute('ROLLBACK')
+            return False
+        _record(conn, migration)
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return True
+
+
+def _is_applied(conn: sqlite3.Connection, version: int) -> bool:
+    row = conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone()
+    return row is not None
+
+
+def _record(conn: sqlite3.Connection, migration: Migration):
+    conn.execute(
+        'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+        (migration.version, migration.description)
+    )
+
+
+__all__ = ['Migration', 'MIGRATIONS', 'run_migrations', 'applied_versions']
@@ -0,0 +1,31 @@
+"""Таблица задач и колонки, добавленные после первой версии схемы."""
+
+import sqlite3
+
+VERSION = 1
+DESCRIPTION = 'Таблица tasks'
+
+
+def upgrade(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            category TEXT DEFAULT 'reminder',
+            event_at TIMESTAMP,
+            remind_at TIMESTAMP,
+            reminder_offset_minutes INTEGER,
+            completed BOOLEAN DEFAULT FALSE,
+            notified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Базы первой версии: event_at и reminder_offset_minutes появились позже
+    cols = [r[1] for r in conn.execute('PRAGMA table_info(tasks)')]
+    if 'event_at' not in cols:
+        conn.execute('ALTER TABLE tasks ADD COLUMN event_at TIMESTAMP')
+    if 'reminder_offset_minutes' not in cols:
+        conn.execute('ALTER TABLE tasks ADD COLUMN reminder_offset_minutes INTEGER')
@@ -0,0 +1,87 @@
+"""Счётчики задач по пользователям, поддерживаемые триггерами."""
+
+import sqlite3
+
+VERSION = 2
+DESCRIPTION = 'Таблица task_counters и индекс (user_id, remind_at)'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Индекс для диапазонных запросов "на сегодня" в рамках пользователя
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_remind
+        ON tasks(user_id, remind_at)
+    ''')
+
+    # Таблица могла быть создана до появления schema_version — тогда
+    # повторно её не заполняем, иначе счётчики удвоятся
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'task_counters'"
+    ).fetchone() is not None
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_counters (
+            user_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            active INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Триггеры на tasks поддерживают total/active/completed в той же
+    # транзакции, что и само изменение, поэтому get_counts читает одну строку
+    # вместо подсчёта всех задач пользователя
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_counters_insert
+        AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO task_counters (user_id, total, active, completed)
+            VALUES (
+                NEW.user_id,
+                1,
+                CASE WHEN NEW.completed THEN 0 ELSE 1 END,
+                CASE WHEN NEW.completed THEN 1 ELSE 0 END
+            )
+            ON CONFLICT(user_id) DO UPDATE SET
+                total = total + 1,
+                active = active + excluded.active,
+                completed = completed + excluded.completed;
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_counters_delete
+        AFTER DELETE ON tasks
+        BEGIN
+            UPDATE task_counters SET
+                total = total - 1,
+                active = active - CASE WHEN OLD.completed THEN 0 ELSE 1 END,
+                completed = completed - CASE WHEN OLD.completed THEN 1 ELSE 0 END
+            WHERE user_id = OLD.user_id;
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_counters_update
+        AFTER UPDATE OF completed ON tasks
+        WHEN (CASE WHEN NEW.completed THEN 1 ELSE 0 END)
+            != (CASE WHEN OLD.completed THEN 1 ELSE 0 END)
+        BEGIN
+            UPDATE task_counters SET
+                active = active + CASE WHEN NEW.completed THEN -1 ELSE 1 END,
+                completed = completed + CASE WHEN NEW.completed THEN 1 ELSE -1 END
+            WHERE user_id = NEW.user_id;
+        END
+    ''')
+
+    if not exists:
+        conn.execute('''
+            INSERT INTO task_counters (user_id, total, active, completed)
+            SELECT
+                user_id,
+                COUNT(*),
+                SUM(CASE WHEN completed THEN 0 ELSE 1 END),
+                SUM(CASE WHEN completed THEN 1 ELSE 0 END)
+            FROM tasks
+            GROUP BY user_id
+        ''')
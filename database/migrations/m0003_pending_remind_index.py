@@ -0,0 +1,17 @@
+"""Частичный индекс под опрос напоминаний планировщиком."""
+
+import sqlite3
+
+VERSION = 3
+DESCRIPTION = 'Частичный индекс idx_tasks_pending_remind'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # В индекс попадают только ожидающие напоминания: отправленные и
+    # выполненные задачи не влияют на стоимость опроса
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_remind')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending_remind
+        ON tasks(remind_at)
+        WHERE completed = 0 AND notified = 0
+    ''')
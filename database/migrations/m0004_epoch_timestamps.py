@@ -0,0 +1,84 @@
+"""Перевод временных меток tasks в целые секунды Unix (DB_TIMESTAMP_FORMAT=epoch)."""
+
+import sqlite3
+
+from database import models
+from database.models import decode_ts
+
+VERSION = 4
+DESCRIPTION = 'Временные метки tasks в epoch-секундах'
+
+TIMESTAMP_COLUMNS = ('event_at', 'remind_at', 'created_at', 'updated_at')
+CHUNK_SIZE = 1000
+
+
+def enabled() -> bool:
+    """Миграция включается только при DB_TIMESTAMP_FORMAT=epoch"""
+    return models.DB_TIMESTAMP_FORMAT == 'epoch'
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Конвертировать строки порциями по CHUNK_SIZE задач.
+
+    Каждая порция — отдельная транзакция, поэтому бот и API продолжают
+    писать во время миграции. Уже сконвертированные строки пропускаются,
+    так что прерванная миграция продолжается с начала без вреда.
+    Если архив (tasks_archive) уже создан, он конвертируется так же.
+
+    Смена записи метки — не изменение задачи: на время UPDATE порции
+    триггеры таблицы (outbox m0008, версии m0009) снимаются и в той же
+    транзакции создаются заново, поэтому событий и новых версий нет, а
+    другие подключения таблицу без триггеров не видят.
+    """
+    for table in ('tasks', 'tasks_archive'):
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if exists:
+            yield from _convert(conn, table)
+
+
+def _convert(conn: sqlite3.Connection, table: str):
+    text_filter = ' OR '.join(f"typeof({col}) = 'text'" for col in TIMESTAMP_COLUMNS)
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f'''
+            SELECT id, {', '.join(TIMESTAMP_COLUMNS)} FROM {table}
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+            ''',
+            (last_id, CHUNK_SIZE)
+        ).fetchall()
+        if not rows:
+            return
+
+        updates = []
+        for task_id, *values in rows:
+            if not any(isinstance(v, str) for v in values):
+                continue
+            encoded = [
+                int(decode_ts(v).timestamp()) if isinstance(v, str) and v else v
+                for v in values
+            ]
+            updates.append((*encoded, task_id))
+
+        if updates:
+            triggers = conn.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?",
+                (table,)
+            ).fetchall()
+            for name, _ in triggers:
+                conn.execute(f'DROP TRIGGER {name}')
+            conn.executemany(
+                f'''
+                UPDATE {table} SET {', '.join(f'{col} = ?' for col in TIMESTAMP_COLUMNS)}
+                WHERE id = ? AND ({text_filter})
+                ''',
+                updates
+            )
+            for _, sql in triggers:
+                conn.execute(sql)
+        last_id = rows[-1][0]
+        yield
@@ -0,0 +1,21 @@
+"""Индексы под keyset-пагинацию списков задач."""
+
+import sqlite3
+
+VERSION = 5
+DESCRIPTION = 'Индексы idx_tasks_user_order и idx_tasks_user_completed'
+
+
+def upgrade(conn: sqlite3.Connection):
+    # Активные/все — по (completed, remind_at, id), выполненные — по
+    # (updated_at, id), см. TaskRepository.get_page. Они же покрывают выборки
+    # по одному user_id, поэтому idx_tasks_user_id больше не нужен.
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_user_id')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_order
+        ON tasks(user_id, completed, IFNULL(remind_at, -1), id)
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_user_completed
+        ON tasks(user_id, completed, updated_at, id)
+    ''')
@@ -0,0 +1,71 @@
+"""Архив давно выполненных задач (холодное хранение)."""
+
+import sqlite3
+
+VERSION = 6
+DESCRIPTION = 'Таблица tasks_archive'
+
+
+def upgrade(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            text TEXT NOT NULL,
+            category TEXT DEFAULT 'reminder',
+            event_at TIMESTAMP,
+            remind_at TIMESTAMP,
+            reminder_offset_minutes INTEGER,
+            completed BOOLEAN DEFAULT TRUE,
+            notified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            archived_at TIMESTAMP
+        )
+    ''')
+
+    # Архив читается только как продолжение списка выполненных
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_archive_user_updated
+        ON tasks_archive(user_id, updated_at, id)
+    ''')
+
+    # Кандидаты на архивацию: выполненные задачи по времени последнего изменения
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_completed_updated
+        ON tasks(updated_at)
+        WHERE completed = 1
+    ''')
+
+    # Архивные задачи продолжают учитываться в task_counters: перенос
+    # tasks -> tasks_archive уменьшает счётчики триггером на tasks и
+    # возвращает их триггером на архиве, в сумме ничего не меняется
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_counters_archive_insert
+        AFTER INSERT ON tasks_archive
+        BEGIN
+            INSERT INTO task_counters (user_id, total, active, completed)
+            VALUES (
+                NEW.user_id,
+                1,
+                CASE WHEN NEW.completed THEN 0 ELSE 1 END,
+                CASE WHEN NEW.completed THEN 1 ELSE 0 END
+            )
+            ON CONFLICT(user_id) DO UPDATE SET
+                total = total + 1,
+                active = active + excluded.active,
+                completed = completed + excluded.completed;
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_counters_archive_delete
+        AFTER DELETE ON tasks_archive
+        BEGIN
+            UPDATE task_counters SET
+                total = total - 1,
+                active = active - CASE WHEN OLD.completed THEN 0 ELSE 1 END,
+                completed = completed - CASE WHEN OLD.completed THEN 1 ELSE 0 END
+            WHERE user_id = OLD.user_id;
+        END
+    ''')
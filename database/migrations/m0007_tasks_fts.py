@@ -0,0 +1,83 @@
+"""Полнотекстовый индекс задач (FTS5)."""
+
+import sqlite3
+
+VERSION = 7
+DESCRIPTION = 'Полнотекстовый индекс tasks_fts'
+
+# Текст для индекса: "ё" -> "е"
+FOLD_SQL = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Создать tasks_fts и триггеры синхронизации.
+
+    Таблица без собственного содержимого (content=''): текст хранится в
+    tasks и tasks_archive, индекс ссылается на задачу по rowid = id.
+    Столбец owner содержит токен "u<user_id>" — поиск пересекает списки
+    документов с токеном владельца и не перебирает чужие задачи.
+
+    unicode61 приводит регистр для кириллицы, remove_diacritics 2 убирает
+    диакритику латиницы; "ё" FTS5 не сводит, поэтому в индекс текст
+    попадает через FOLD_SQL (и запрос складывается так же в репозитории).
+    prefix='2 3' ускоряет поиск по началу слова.
+    Если SQLite собран без FTS5, миграция ничего не создаёт — поиск
+    работает через LIKE.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                text,
+                owner,
+                content = '',
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        if 'fts5' not in str(e):
+            raise
+        print("⚠️ SQLite без FTS5: поиск задач будет работать через LIKE")
+        return
+
+    # При переносе задачи между tasks и tasks_archive строка какое-то время
+    # есть в обеих таблицах — такие вставки/удаления индекс не трогают
+    new_text, old_text = FOLD_SQL.format('NEW.text'), FOLD_SQL.format('OLD.text')
+    for table, other in (('tasks', 'tasks_archive'), ('tasks_archive', 'tasks')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert
+            AFTER INSERT ON {table}
+            BEGIN
+                INSERT INTO tasks_fts (rowid, text, owner)
+                SELECT NEW.id, {new_text}, 'u' || NEW.user_id
+                WHERE NOT EXISTS (SELECT 1 FROM {other} WHERE id = NEW.id);
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, text, owner)
+                SELECT 'delete', OLD.id, {old_text}, 'u' || OLD.user_id
+                WHERE NOT EXISTS (SELECT 1 FROM {other} WHERE id = OLD.id);
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update
+            AFTER UPDATE OF text, user_id ON {table}
+            BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, text, owner)
+                VALUES ('delete', OLD.id, {old_text}, 'u' || OLD.user_id);
+                INSERT INTO tasks_fts (rowid, text, owner)
+                VALUES (NEW.id, {new_text}, 'u' || NEW.user_id);
+            END
+        ''')
+
+    # Индексируем уже существующие задачи
+    text = FOLD_SQL.format('text')
+    conn.execute(f'''
+        INSERT INTO tasks_fts (rowid, text, owner)
+        SELECT id, {text}, 'u' || user_id FROM tasks
+        UNION ALL
+        SELECT id, {text}, 'u' || user_id FROM tasks_archive
+    ''')
@@ -0,0 +1,74 @@
+"""Outbox изменений задач (task_events)."""
+
+import sqlite3
+
+VERSION = 8
+DESCRIPTION = 'Таблица task_events и триггеры outbox'
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Журнал изменений задач, который пишут триггеры в той же транзакции.
+
+    Читатели (планировщик бота, кэш API) идут по нему по возрастанию id.
+    AUTOINCREMENT гарантирует, что id не переиспользуются после очистки
+    старых событий. Перенос задачи в архив и обратно (строка на время
+    переноса есть в обеих таблицах) и отметка notified событий не создают.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            remind_at TIMESTAMP,
+            completed BOOLEAN,
+            notified BOOLEAN,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_events_insert
+        AFTER INSERT ON tasks
+        WHEN NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = NEW.id)
+        BEGIN
+            INSERT INTO task_events (task_id, user_id, kind, remind_at, completed, notified)
+            VALUES (NEW.id, NEW.user_id, 'created', NEW.remind_at, NEW.completed, NEW.notified);
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_events_update
+        AFTER UPDATE ON tasks
+        WHEN OLD.text IS NOT NEW.text
+            OR OLD.category IS NOT NEW.category
+            OR OLD.event_at IS NOT NEW.event_at
+            OR OLD.remind_at IS NOT NEW.remind_at
+            OR OLD.reminder_offset_minutes IS NOT NEW.reminder_offset_minutes
+            OR OLD.completed IS NOT NEW.completed
+        BEGIN
+            INSERT INTO task_events (task_id, user_id, kind, remind_at, completed, notified)
+            VALUES (NEW.id, NEW.user_id, 'updated', NEW.remind_at, NEW.completed, NEW.notified);
+        END
+    ''')
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_events_delete
+        AFTER DELETE ON tasks
+        WHEN NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = OLD.id)
+        BEGIN
+            INSERT INTO task_events (task_id, user_id, kind)
+            VALUES (OLD.id, OLD.user_id, 'deleted');
+        END
+    ''')
+
+    # Удаление задачи из архива — тоже событие для читателей
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_task_events_archive_delete
+        AFTER DELETE ON tasks_archive
+        WHEN NOT EXISTS (SELECT 1 FROM tasks WHERE id = OLD.id)
+        BEGIN
+            INSERT INTO task_events (task_id, user_id, kind)
+            VALUES (OLD.id, OLD.user_id, 'deleted');
+        END
+    ''')
@@ -0,0 +1,105 @@
+"""Версии изменений задач и tombstones для дельта-синхронизации."""
+
+import sqlite3
+
+VERSION = 9
+DESCRIPTION = 'Версии задач (user_id, version) и task_tombstones'
+
+# Изменения, видимые клиенту (notified и служебные колонки версию не двигают)
+VISIBLE_CHANGE = '''
+    OLD.text IS NOT NEW.text
+    OR OLD.category IS NOT NEW.category
+    OR OLD.event_at IS NOT NEW.event_at
+    OR OLD.remind_at IS NOT NEW.remind_at
+    OR OLD.reminder_offset_minutes IS NOT NEW.reminder_offset_minutes
+    OR OLD.completed IS NOT NEW.completed
+'''
+
+# Следующая версия пользователя: счётчик хранится в task_counters
+BUMP_VERSION = '''
+    INSERT INTO task_counters (user_id, total, active, completed, version)
+    VALUES ({user}.user_id, 0, 0, 0, 1)
+    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+'''
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Монотонная версия изменений на пользователя.
+
+    Каждое видимое изменение задачи увеличивает task_counters.version и
+    записывает новое значение в строку задачи; удаление пишет tombstone с
+    этой версией. Задачи, существовавшие до миграции, получают версию 0 —
+    клиент знает о них из полного списка. Перенос в архив и обратно версию
+    не меняет: архивная строка хранит её вместе с остальными колонками.
+
+    pruned_version — наибольшая версия удалённых при сжатии tombstones:
+    клиенту с более старой версией нужна полная перезагрузка списка.
+    """
+    for table in ('tasks', 'tasks_archive'):
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if 'version' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_version
+            ON {table}(user_id, version)
+        ''')
+
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(task_counters)')}
+    for column in ('version', 'pruned_version'):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE task_counters ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_tombstones (
+            task_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_task_tombstones_user_version
+        ON task_tombstones(user_id, version)
+    ''')
+
+    # Вставка (кроме возврата из архива — строка в этот момент есть в обеих таблицах)
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_task_version_insert
+        AFTER INSERT ON tasks
+        WHEN NOT EXISTS (SELECT 1 FROM tasks_archive WHERE id = NEW.id)
+        BEGIN
+            {BUMP_VERSION.format(user='NEW')}
+            UPDATE tasks SET version = (
+                SELECT version FROM task_counters WHERE user_id = NEW.user_id
+            ) WHERE id = NEW.id;
+        END
+    ''')
+
+    # Само проставление версии колонку version меняет, но под WHEN не попадает
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_task_version_update
+        AFTER UPDATE ON tasks
+        WHEN {VISIBLE_CHANGE}
+        BEGIN
+            {BUMP_VERSION.format(user='NEW')}
+            UPDATE tasks SET version = (
+                SELECT version FROM task_counters WHERE user_id = NEW.user_id
+            ) WHERE id = NEW.id;
+        END
+    ''')
+
+    for table, other in (('tasks', 'tasks_archive'), ('tasks_archive', 'tasks')):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_tombstone
+            AFTER DELETE ON {table}
+            WHEN NOT EXISTS (SELECT 1 FROM {other} WHERE id = OLD.id)
+            BEGIN
+                {BUMP_VERSION.format(user='OLD')}
+                INSERT OR REPLACE INTO task_tombstones (task_id, user_id, version)
+                VALUES (
+                    OLD.id,
+                    OLD.user_id,
+                    (SELECT version FROM task_counters WHERE user_id = OLD.user_id)
+                );
+            END
+        ''')
@@ -0,0 +1,33 @@
+"""Инкрементальная очистка файла базы (auto_vacuum = INCREMENTAL)."""
+
+import sqlite3
+
+VERSION = 10
+DESCRIPTION = 'auto_vacuum = INCREMENTAL'
+
+# VACUUM нельзя выполнить внутри транзакции
+TRANSACTION = False
+
+# Файл не больше стольких страниц перестраивается при старте сразу:
+# это новая (почти пустая) база, VACUUM займёт миллисекунды
+STARTUP_VACUUM_MAX_PAGES = 256
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Перевести базу в режим auto_vacuum = INCREMENTAL.
+
+    Без него освобождённые удалением страницы остаются в файле навсегда.
+    В инкрементальном режиме их возвращает ``PRAGMA incremental_vacuum(N)``
+    небольшими порциями (см. database.maintenance). Режим существующей
+    базы меняется только полным VACUUM, который на всё время перестройки
+    блокирует запись, — поэтому при старте он выполняется только для
+    новой базы. Существующая переводится отдельной командой
+    ``python run.py vacuum`` (database.maintenance.enable_incremental_vacuum).
+    """
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    if conn.execute('PRAGMA page_count').fetchone()[0] <= STARTUP_VACUUM_MAX_PAGES:
+        conn.execute('VACUUM')
+    else:
+        print("⚠️ auto_vacuum не INCREMENTAL: переведите базу командой `python run.py vacuum`")
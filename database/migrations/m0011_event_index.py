@@ -0,0 +1,21 @@
+"""Индекс по времени события для календаря."""
+
+import sqlite3
+
+VERSION = 11
+DESCRIPTION = 'Индексы idx_tasks_user_event и idx_tasks_archive_user_event'
+
+# Время задачи в календаре: событие, а у задач без него — напоминание
+# (так же выбирает время Mini App). Запросы должны использовать ровно это
+# выражение, иначе индекс не подойдёт.
+EVENT_KEY = 'IFNULL(event_at, remind_at)'
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Диапазон месяца (TaskRepository.get_range) — поиск по индексу
+    (user_id, время события) в tasks и в архиве."""
+    for table in ('tasks', 'tasks_archive'):
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{table}_user_event
+            ON {table}(user_id, {EVENT_KEY})
+        ''')
@@ -0,0 +1,21 @@
+"""Аренда напоминаний планировщиком (несколько экземпляров бота)."""
+
+import sqlite3
+
+VERSION = 12
+DESCRIPTION = 'Колонки claimed_by и claim_expires_at в tasks'
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Кто из экземпляров бота отправляет напоминание и до какого времени.
+
+    Колонки служебные: триггеры outbox и версий их не отслеживают, в архив
+    они не переносятся. claim_expires_at — секунды Unix при любом
+    DB_TIMESTAMP_FORMAT: аренда короткая и от формата меток не зависит. Отдельный индекс не нужен — захват идёт по
+    частичному idx_tasks_pending_remind, захваченных строк в нём немного.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(tasks)')}
+    if 'claimed_by' not in columns:
+        conn.execute('ALTER TABLE tasks ADD COLUMN claimed_by TEXT')
+    if 'claim_expires_at' not in columns:
+        conn.execute('ALTER TABLE tasks ADD COLUMN claim_expires_at INTEGER')
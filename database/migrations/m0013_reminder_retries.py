@@ -0,0 +1,35 @@
+"""Повторные попытки отправки напоминаний и dead-letter."""
+
+import sqlite3
+
+VERSION = 13
+DESCRIPTION = 'Колонки attempts, next_attempt_at, dead_letter_at, last_error; idx_tasks_pending_remind'
+
+COLUMNS = (
+    ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+    ('next_attempt_at', 'INTEGER'),
+    ('dead_letter_at', 'INTEGER'),
+    ('last_error', 'TEXT'),
+)
+
+
+def upgrade(conn: sqlite3.Connection):
+    """Счётчик неудачных отправок, время следующей попытки и отметка
+    dead-letter (секунды Unix, как claim_expires_at) с текстом последней
+    ошибки.
+
+    Напоминания в dead-letter больше не отправляются, поэтому они выходят
+    из частичного индекса опроса: запросы к нему должны содержать то же
+    условие ``dead_letter_at IS NULL``.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(tasks)')}
+    for name, definition in COLUMNS:
+        if name not in columns:
+            conn.execute(f'ALTER TABLE tasks ADD COLUMN {name} {definition}')
+
+    conn.execute('DROP INDEX IF EXISTS idx_tasks_pending_remind')
+    conn.execute('''
+        CREATE INDEX idx_tasks_pending_remind
+        ON tasks(remind_at)
+        WHERE completed = 0 AND notified = 0 AND dead_letter_at IS NULL
+    ''')
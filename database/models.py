@@ -1,9 +1,76 @@
+import os
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
 
+# Формат хранения временных меток в БД:
+# 'iso'   — ISO-строки (по умолчанию, прежний формат)
+# 'epoch' — целые секунды Unix (компактнее, без разбора строк, целочисленные индексы)
+# При переключении на 'epoch' init_db() конвертирует существующие строки.
+# После конвертации формат — свойство базы: init_db() выставляет его по
+# применённым миграциям (set_timestamp_format), а не по переменной окружения.
+DB_TIMESTAMP_FORMAT: str = os.getenv('DB_TIMESTAMP_FORMAT', 'iso').lower()
 
-@dataclass
+
+def set_timestamp_format(fmt: str):
+    """Задать формат записи временных меток для процесса ('iso' или 'epoch')"""
+    global DB_TIMESTAMP_FORMAT
+    DB_TIMESTAMP_FORMAT = fmt
+
+
+def encode_ts(dt: Optional[datetime]) -> Union[str, int, None]:
+    """Преобразовать datetime в значение для записи в БД (по DB_TIMESTAMP_FORMAT)"""
+    if dt is None:
+        return None
+    if DB_TIMESTAMP_FORMAT == 'epoch':
+        return int(dt.timestamp())
+    return dt.isoformat()
+
+
+def decode_ts(value: Union[str, int, float, None]) -> Optional[datetime]:
+    """Прочитать временную метку из БД.
+
+    Понимает оба формата независимо от настройки — во время миграции
+    в таблице одновременно встречаются строки и числа.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    return datetime.fromisoformat(value)
+
+
+# Порядок колонок tasks в актуальной схеме и в самой первой (до event_at /
+# reminder_offset_minutes). Используется, когда описание курсора недоступно.
+TASK_COLUMNS = (
+    'id', 'user_id', 'text', 'category', 'event_at', 'remind_at',
+    'reminder_offset_minutes', 'completed', 'notified', 'created_at', 'updated_at',
+    'version'
+)
+LEGACY_TASK_COLUMNS = (
+    'id', 'user_id', 'text', 'category', 'remind_at', 'completed', 'notified',
+    'created_at', 'updated_at'
+)
+
+
+@lru_cache(maxsize=64)
+def _column_map(columns: Tuple[str, ...]) -> Tuple[Optional[int], ...]:
+    """Позиции полей Task в строке с данными колонками (None — колонки нет).
+
+    Кэшируется по набору имён, поэтому на весь результат запроса (и на все
+    последующие запросы с той же формой) разбор выполняется один раз.
+    """
+    index = {name: i for i, name in enumerate(columns)}
+    return tuple(index.get(name) for name in TASK_COLUMNS)
+
+
+def description_columns(description) -> Tuple[str, ...]:
+    """Имена колонок из cursor.description"""
+    return tuple(d[0] for d in description)
+
+
+@dataclass(slots=True)
 class Task:
     """Модель задачи"""
     id: int
@@ -17,83 +84,55 @@ class Task:
     notified: bool
     created_at: datetime
     updated_at: datetime
+    # Версия последнего изменения (дельта-синхронизация); 0 — до её появления
+    version: int = 0
     
     @classmethod
-    def from_row(cls, row: tuple) -> 'Task':
-        """Создать Task из строки БД"""
-        # Support both old and new schemas (columns order may differ depending on DB migration)
-        # Old schema rows length: 9 (id, user_id, text, category, remind_at, completed, notified, created_at, updated_at)
-        # New schema rows length: 11 (id, user_id, text, category, event_at, remind_at, reminder_offset_minutes, completed, notified, created_at, updated_at)
-        if len(row) == 9:
-            # legacy layout
-            return cls(
-                id=row[0],
-                user_id=row[1],
-                text=row[2],
-                category=row[3] or 'reminder',
-                event_at=datetime.fromisoformat(row[4]) if row[4] else None,
-                remind_at=datetime.fromisoformat(row[4]) if row[4] else None,
-                reminder_offset_minutes=None,
-                completed=bool(row[5]),
-                notified=bool(row[6]),
-                created_at=datetime.fromisoformat(row[7]) if row[7] else datetime.now(),
-                updated_at=datetime.fromisoformat(row[8]) if row[8] else datetime.now()
-            )
+    def from_row(cls, row: Sequence, columns: Optional[Tuple[str, ...]] = None) -> 'Task':
+        """Создать Task из строки БД
 
-        # For rows with new schema or with appended columns, try to map by expected positions and fallback gracefully
-        # Prefer to read known positions if available
-        def safe_iso(val):
-            return datetime.fromisoformat(val) if val else None
-
-        # Try to detect event_at position: if len >= 11 assume new schema
-        if len(row) >= 11:
-            return cls(
-                id=row[0],
-                user_id=row[1],
-                text=row[2],
-                category=row[3] or 'reminder',
-                event_at=safe_iso(row[4]),
-                remind_at=safe_iso(row[5]),
-                reminder_offset_minutes=int(row[6]) if row[6] is not None else None,
-                completed=bool(row[7]),
-                notified=bool(row[8]),
-                created_at=safe_iso(row[9]) or datetime.now(),
-                updated_at=safe_iso(row[10]) or datetime.now()
-            )
+        Поля сопоставляются по именам колонок (``columns``, обычно из
+        ``cursor.description``), поэтому порядок колонок не важен: строки
+        старой схемы, где event_at и reminder_offset_minutes добавлены через
+        ALTER TABLE в конец, читаются так же, как новые. Без ``columns``
+        порядок берётся по умолчанию для старой (9 колонок) или новой схемы.
+        """
+        if columns is None:
+            columns = LEGACY_TASK_COLUMNS if len(row) == 9 else TASK_COLUMNS[:len(row)]
+        return cls._build(row, _column_map(columns))
 
-        # Fallback: try to find timestamp-like fields by content (best-effort)
-        # We'll attempt a tolerant mapping using known column types positions
-        try:
-            # attempt to parse by names/heuristics
-            # assume: id, user_id, text, category, remind_at, completed, notified, created_at, updated_at, [maybe event_at, reminder_offset_minutes]
-            return cls(
-                id=row[0],
-                user_id=row[1],
-                text=row[2],
-                category=row[3] or 'reminder',
-                event_at=safe_iso(row[4]) if isinstance(row[4], str) and 'T' in row[4] else None,
-                remind_at=safe_iso(row[4]) if isinstance(row[4], str) and 'T' in row[4] else None,
-                reminder_offset_minutes=None,
-                completed=bool(row[5]),
-                notified=bool(row[6]),
-                created_at=safe_iso(row[7]) or datetime.now(),
-                updated_at=safe_iso(row[8]) or datetime.now()
-            )
-        except Exception:
-            # last resort: create minimal object
-            return cls(
-                id=row[0],
-                user_id=row[1],
-                text=row[2],
-                category='reminder',
-                event_at=None,
-                remind_at=None,
-                reminder_offset_minutes=None,
-                completed=False,
-                notified=False,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence], description) -> List['Task']:
+        """Создать список Task из результата запроса (с cursor.description)"""
+        positions = _column_map(description_columns(description))
+        return [cls._build(row, positions) for row in rows]
+
+    @classmethod
+    def _build(cls, row: Sequence, positions: Tuple[Optional[int], ...]) -> 'Task':
+        (i_id, i_user, i_text, i_category, i_event, i_remind,
+         i_offset, i_completed, i_notified, i_created, i_updated, i_version) = positions
+
+        remind_at = decode_ts(row[i_remind]) if i_remind is not None else None
+        # В старой схеме event_at не было — время события совпадает с remind_at
+        event_at = decode_ts(row[i_event]) if i_event is not None else remind_at
+        offset = row[i_offset] if i_offset is not None else None
+        created_at = decode_ts(row[i_created]) if i_created is not None else None
+        updated_at = decode_ts(row[i_updated]) if i_updated is not None else None
+
+        return cls(
+            row[i_id],
+            row[i_user],
+            row[i_text],
+            (row[i_category] if i_category is not None else None) or 'reminder',
+            event_at,
+            remind_at,
+            int(offset) if offset is not None else None,
+            bool(row[i_completed]) if i_completed is not None else False,
+            bool(row[i_notified]) if i_notified is not None else False,
+            created_at or datetime.now(),
+            updated_at or datetime.now(),
+            row[i_version] if i_version is not None else 0
+        )
     
     def to_dict(self) -> dict:
         """Преобразовать в словарь для API"""
@@ -106,6 +145,113 @@ class Task:
             'remind_at': self.remind_at.isoformat() if self.remind_at else None,
             'reminder_offset_minutes': self.reminder_offset_minutes,
             'completed': self.completed,
+            'notified': self.notified,
             'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'updated_at': self.updated_at.isoformat(),
+            'version': self.version
         }
+
+
+@dataclass(slots=True)
+class TaskPage:
+    """Страница списка задач"""
+    tasks: List[Task]
+    # Курсор следующей страницы (None — это последняя страница)
+    next_cursor: Optional[str] = None
+    # Версия изменений пользователя, прочитанная в том же снимке, что и страница
+    version: int = 0
+
+
+@dataclass(slots=True)
+class TaskChanges:
+    """Изменения задач пользователя после версии ``since`` (дельта-синхронизация)"""
+    tasks: List[Task]
+    # id удалённых задач (из tombstones)
+    deleted: List[int]
+    # Версия, с которой запрашивать следующие изменения
+    version: int
+    # Изменений больше, чем вошло в ответ, — запросить ещё раз с новой версией
+    has_more: bool = False
+    # Версия устарела (tombstones сжаты) или неизвестна — нужен полный список
+    full_resync: bool = False
+
+
+@dataclass(slots=True)
+class BatchResult:
+    """Результат одной операции пакета (TaskRepository.batch)"""
+    # created, updated, toggled, deleted, not_found, invalid
+    status: str
+    id: Optional[int] = None
+
+
+@dataclass(slots=True)
+class PendingReminder:
+    """Напоминание к отправке — только поля, нужные планировщику"""
+    id: int
+    user_id: int
+    text: str
+    category: str
+    remind_at: Optional[datetime]
+    # Неудачных попыток отправки и время следующей (после ошибки)
+    attempts: int = 0
+    next_attempt_at: Optional[datetime] = None
+
+    @property
+    def due_at(self) -> Optional[datetime]:
+        """Когда отправлять: время напоминания или следующей попытки"""
+        if self.next_attempt_at is None or self.remind_at is None:
+            return self.remind_at
+        return max(self.remind_at, self.next_attempt_at)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'PendingReminder':
+        """Создать из строки (id, user_id, text, category, remind_at[, attempts, next_attempt_at])
+
+        next_attempt_at хранится в секундах Unix при любом формате меток.
+        """
+        return cls(
+            id=row[0],
+            user_id=row[1],
+            text=row[2],
+            category=row[3] or 'reminder',
+            remind_at=decode_ts(row[4]),
+            attempts=row[5] if len(row) > 5 else 0,
+            next_attempt_at=(
+                datetime.fromtimestamp(row[6]) if len(row) > 6 and row[6] is not None else None
+            )
+        )
+
+
+@dataclass(slots=True)
+class TaskEvent:
+    """Событие из outbox task_events (created, updated, deleted)"""
+    id: int
+    task_id: int
+    user_id: int
+    kind: str
+    remind_at: Optional[datetime]
+    completed: bool
+    notified: bool
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'TaskEvent':
+        """Создать из строки (id, task_id, user_id, kind, remind_at, completed, notified)"""
+        return cls(
+            id=row[0],
+            task_id=row[1],
+            user_id=row[2],
+            kind=row[3],
+            remind_at=decode_ts(row[4]),
+            completed=bool(row[5]),
+            notified=bool(row[6])
+        )
+
+    @property
+    def needs_reminder(self) -> bool:
+        """Задача ждёт напоминания (есть время, не выполнена и не отправлена)"""
+        return (
+            self.kind != 'deleted'
+            and self.remind_at is not None
+            and not self.completed
+            and not self.notified
+        )
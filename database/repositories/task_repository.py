@@ -1,7 +1,167 @@
+import asyncio
+import base64
+import binascii
+import json
+import re
+import time
 from datetime import datetime, timedelta
-from typing import Optional, List
-from database.connection import get_db
-from database.models import Task
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from database.cache import MISS, task_cache
+from database.connection import (
+    DB_SHARDS, read_db, read_snapshot, run_write, shard_for_task, shard_for_user
+)
+from database.models import (
+    TASK_COLUMNS, BatchResult, PendingReminder, Task, TaskChanges, TaskEvent, TaskPage,
+    decode_ts, description_columns, encode_ts
+)
+
+
+# Время задачи в календаре — то же выражение, что в индексах m0011
+EVENT_KEY = 'IFNULL(event_at, remind_at)'
+
+
+def _encode_cursor(filter: str, key: list) -> str:
+    """Упаковать позицию в списке в непрозрачный курсор"""
+    raw = json.dumps([filter, *key], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str, filter: str, size: int = 3) -> list:
+    """Распаковать курсор: [сегмент, ключ сортировки, id] (или ``size`` других значений)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, binascii.Error):
+        raise ValueError('Invalid cursor')
+    if not isinstance(data, list) or len(data) != size + 1 or data[0] != filter:
+        raise ValueError('Invalid cursor')
+    return data[1:]
+
+
+def _is_scalar(value, types) -> bool:
+    """Значение из курсора нужного типа (bool не считается числом)"""
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+# Не больше стольких слов из поискового запроса
+SEARCH_MAX_TERMS = 10
+
+# Есть ли в базе FTS5-индекс tasks_fts (проверяется один раз на процесс)
+_fts_available: Optional[bool] = None
+
+
+def _search_terms(query: str) -> List[str]:
+    """Слова запроса в нижнем регистре (кавычки и операторы FTS отбрасываются)"""
+    return re.findall(r'\w+', query.lower().replace('ё', 'е'))[:SEARCH_MAX_TERMS]
+
+
+async def _has_fts(db) -> bool:
+    global _fts_available
+    if _fts_available is None:
+        cursor = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+        )
+        _fts_available = await cursor.fetchone() is not None
+    return _fts_available
+
+
+def _compute_remind(
+    event_at: Optional[datetime],
+    reminder_offset_minutes: Optional[int],
+    remind_at: Optional[datetime]
+) -> Optional[datetime]:
+    """Если remind_at не передан, вычислить его из event_at и reminder_offset_minutes"""
+    if remind_at is not None or event_at is None:
+        return remind_at
+    if reminder_offset_minutes is not None:
+        return event_at - timedelta(minutes=reminder_offset_minutes)
+    return event_at
+
+
+# Колонки, изменение которых двигает версию задачи (VISIBLE_CHANGE в m0009)
+VISIBLE_COLUMNS = (
+    'text', 'category', 'event_at', 'remind_at', 'reminder_offset_minutes', 'completed'
+)
+# Версия, которую триггер m0009 присвоит изменённой строке tasks
+NEXT_VERSION = 'IFNULL((SELECT version FROM task_counters WHERE user_id = tasks.user_id), 0) + 1'
+
+# Колонки доставки, сбрасываемые при переносе времени задачи
+RESCHEDULE_RESET = (
+    ('attempts', '0'),
+    ('next_attempt_at', 'NULL'),
+    ('dead_letter_at', 'NULL'),
+    ('last_error', 'NULL'),
+    ('claimed_by', 'NULL'),
+    ('claim_expires_at', 'NULL'),
+)
+
+
+def _update_assignments(
+    text: Optional[str] = None,
+    category: Optional[str] = None,
+    event_at: Optional[datetime] = None,
+    reminder_offset_minutes: Optional[int] = None,
+    remind_at: Optional[datetime] = None,
+    completed: Optional[bool] = None
+) -> Tuple[List[str], list]:
+    """SET-часть UPDATE по переданным полям (None — поле не меняется)
+
+    Returns:
+        (["колонка = ?", ...], значения); пустые списки — менять нечего
+    """
+    # Собираем поля для обновления
+    fields = [
+        (col, value) for col, value in (
+            ('text', text),
+            ('category', category),
+            ('event_at', encode_ts(event_at)),
+            ('reminder_offset_minutes', reminder_offset_minutes),
+            ('remind_at', encode_ts(remind_at)),
+            ('completed', completed),
+        )
+        if value is not None
+    ]
+    if not fields:
+        return [], []
+
+    updates = [f'{col} = ?' for col, _ in fields]
+    values = [value for _, value in fields]
+
+    def changed(columns) -> Tuple[str, list]:
+        # Условие по старым значениям строки: SET видит их, а не новые
+        checks = [(col, value) for col, value in fields if col in columns]
+        return ' OR '.join(f'{col} IS NOT ?' for col, _ in checks), [value for _, value in checks]
+
+    # Новое время — новое напоминание: попытки, отложенный повтор,
+    # dead-letter и аренда прежнего отсчитываются заново. Повтор того же
+    # времени не снимает аренду с отправки, которая уже идёт
+    condition, params = changed(('event_at', 'remind_at'))
+    if condition:
+        for col, reset in RESCHEDULE_RESET:
+            updates.append(f'{col} = CASE WHEN {condition} THEN {reset} ELSE {col} END')
+            values.extend(params)
+
+    # Версию, которую поставит триггер m0009, проставляем сразу: тогда она
+    # есть в RETURNING без отдельного запроса. Условие то же, что VISIBLE_CHANGE
+    condition, params = changed(VISIBLE_COLUMNS)
+    updates.append(f'version = CASE WHEN {condition} THEN {NEXT_VERSION} ELSE version END')
+    values.extend(params)
+
+    updates.append('updated_at = ?')
+    values.append(encode_ts(datetime.now()))
+    return updates, values
+
+
+async def _returned_task(db, cursor) -> Optional[Task]:
+    """Задача из ``INSERT/UPDATE ... RETURNING *`` (None — строка не затронута).
+
+    RETURNING не видит изменений AFTER-триггеров, поэтому версию запросы
+    проставляют сами (NEXT_VERSION) — то же значение затем пишет триггер m0009.
+    """
+    row = await cursor.fetchone()
+    if row is None:
+        return None
+    return Task.from_row(row, description_columns(cursor.description))
 
 
 class TaskRepository:
@@ -15,127 +175,693 @@ class TaskRepository:
         event_at: Optional[datetime] = None,
         reminder_offset_minutes: Optional[int] = None,
         remind_at: Optional[datetime] = None
-    ) -> int:
-        """Создать новую задачу"""
-        db = await get_db()
-        # если remind_at не передан, вычислим его из event_at и reminder_offset_minutes
-        computed_remind = remind_at
-        if computed_remind is None and event_at is not None:
-            if reminder_offset_minutes is not None:
-                computed_remind = event_at - timedelta(minutes=reminder_offset_minutes)
-            else:
-                computed_remind = event_at
+    ) -> Task:
+        """Создать новую задачу (возвращает созданную строку)"""
+        computed_remind = _compute_remind(event_at, reminder_offset_minutes, remind_at)
 
-        cursor = await db.execute(
-            '''
-            INSERT INTO tasks (user_id, text, category, event_at, remind_at, reminder_offset_minutes)
-            VALUES (?, ?, ?, ?, ?, ?)
-            ''',
-            (
-                user_id,
-                text,
-                category,
-                event_at.isoformat() if event_at else None,
-                computed_remind.isoformat() if computed_remind else None,
-                reminder_offset_minutes
+        # Метки создания ставим явно — DEFAULT CURRENT_TIMESTAMP пишет строку в UTC
+        now = encode_ts(datetime.now())
+
+        async def op(db):
+            cursor = await db.execute(
+                '''
+                INSERT INTO tasks (
+                    user_id, text, category, event_at, remind_at, reminder_offset_minutes,
+                    created_at, updated_at, version
+                )
+                VALUES (
+                    ?, ?, ?, ?, ?, ?, ?, ?,
+                    IFNULL((SELECT version FROM task_counters WHERE user_id = ?), 0) + 1
+                )
+                RETURNING *
+                ''',
+                (
+                    user_id,
+                    text,
+                    category,
+                    encode_ts(event_at),
+                    encode_ts(computed_remind),
+                    reminder_offset_minutes,
+                    now,
+                    now,
+                    user_id
+                )
             )
-        )
-        await db.commit()
-        return cursor.lastrowid
+            return await _returned_task(db, cursor)
+
+        task = await run_write(op, shard_for_user(user_id))
+        task_cache.invalidate_user(user_id)
+        return task
     
+    @staticmethod
+    async def create_many(user_id: int, tasks: Iterable[dict]) -> int:
+        """Создать пачку задач одной транзакцией (импорт)
+
+        Элементы ``tasks`` — словари с полями TaskCreate, плюс необязательные
+        ``completed``, ``notified`` и ``created_at``. Без ``notified`` (или
+        с None) напоминание в прошлом считается уже отправленным — иначе
+        повторный импорт выгрузки разослал бы их все заново.
+
+        Returns:
+            Количество созданных задач
+        """
+        now = datetime.now()
+        rows = []
+        for task in tasks:
+            remind_at = _compute_remind(
+                task.get('event_at'), task.get('reminder_offset_minutes'), task.get('remind_at')
+            )
+            notified = task.get('notified')
+            if notified is None:
+                # Через timestamp(): в импорте бывают метки с часовым поясом
+                notified = remind_at is not None and remind_at.timestamp() <= now.timestamp()
+            rows.append((
+                user_id,
+                task['text'],
+                task.get('category') or 'reminder',
+                encode_ts(task.get('event_at')),
+                encode_ts(remind_at),
+                task.get('reminder_offset_minutes'),
+                bool(task.get('completed', False)),
+                bool(notified),
+                encode_ts(task.get('created_at') or now),
+                encode_ts(now)
+            ))
+        if not rows:
+            return 0
+
+        async def op(db):
+            await db.executemany(
+                '''
+                INSERT INTO tasks (
+                    user_id, text, category, event_at, remind_at, reminder_offset_minutes,
+                    completed, notified, created_at, updated_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''',
+                rows
+            )
+            return len(rows)
+
+        created = await run_write(op, shard_for_user(user_id))
+        task_cache.invalidate_user(user_id)
+        return created
+
     @staticmethod
     async def get_by_id(task_id: int, user_id: int) -> Optional[Task]:
         """Получить задачу по ID"""
-        db = await get_db()
-        cursor = await db.execute(
-            'SELECT * FROM tasks WHERE id = ? AND user_id = ?',
-            (task_id, user_id)
-        )
-        row = await cursor.fetchone()
-        return Task.from_row(row) if row else None
+        key = (user_id, 'task', task_id)
+        task = task_cache.get(key)
+        if task is not MISS:
+            return task
+
+        generation = task_cache.generation()
+        task = None
+        async with read_db(shard_for_user(user_id)) as db:
+            for table in ('tasks', 'tasks_archive'):
+                cursor = await db.execute(
+                    f'SELECT * FROM {table} WHERE id = ? AND user_id = ?',
+                    (task_id, user_id)
+                )
+                row = await cursor.fetchone()
+                if row:
+                    task = Task.from_row(row, description_columns(cursor.description))
+                    break
+        task_cache.set(key, task, generation)
+        return task
     
     @staticmethod
     async def get_all_by_user(user_id: int) -> List[Task]:
         """Получить все задачи пользователя"""
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            SELECT * FROM tasks 
-            WHERE user_id = ? 
-            ORDER BY completed, remind_at
-            ''',
-            (user_id,)
-        )
-        rows = await cursor.fetchall()
-        return [Task.from_row(row) for row in rows]
+        return (await TaskRepository.get_page(user_id, 'all', include_archive=True)).tasks
     
     @staticmethod
     async def get_today(user_id: int) -> List[Task]:
         """Получить задачи на сегодня"""
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today_start.replace(hour=23, minute=59, second=59)
-        
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            SELECT * FROM tasks 
-            WHERE user_id = ? 
-            AND remind_at BETWEEN ? AND ?
-            ORDER BY remind_at
-            ''',
-            (user_id, today_start.isoformat(), today_end.isoformat())
-        )
-        rows = await cursor.fetchall()
-        return [Task.from_row(row) for row in rows]
+        return (await TaskRepository.get_page(user_id, 'today')).tasks
     
     @staticmethod
     async def get_active(user_id: int) -> List[Task]:
         """Получить активные (невыполненные) задачи"""
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            SELECT * FROM tasks 
-            WHERE user_id = ? AND completed = FALSE
-            ORDER BY remind_at
-            ''',
-            (user_id,)
-        )
-        rows = await cursor.fetchall()
-        return [Task.from_row(row) for row in rows]
+        return (await TaskRepository.get_page(user_id, 'active')).tasks
     
     @staticmethod
     async def get_completed(user_id: int) -> List[Task]:
         """Получить выполненные задачи"""
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            SELECT * FROM tasks 
-            WHERE user_id = ? AND completed = TRUE
-            ORDER BY updated_at DESC
-            ''',
-            (user_id,)
+        return (await TaskRepository.get_page(user_id, 'completed', include_archive=True)).tasks
+
+    @staticmethod
+    async def iter_all(user_id: int, chunk_size: int = 500) -> AsyncIterator[Task]:
+        """Перебрать все задачи пользователя, включая архив (экспорт)
+
+        Строки читаются из курсора порциями по ``chunk_size``, поэтому
+        список задач целиком в памяти не собирается. Подключение из пула
+        читателей занято, пока перебор не закончится.
+        """
+        async with read_db(shard_for_user(user_id)) as db:
+            for table in ('tasks', 'tasks_archive'):
+                cursor = await db.execute(f'SELECT * FROM {table} WHERE user_id = ?', (user_id,))
+                columns = description_columns(cursor.description)
+                try:
+                    while True:
+                        rows = await cursor.fetchmany(chunk_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield Task.from_row(row, columns)
+                finally:
+                    await cursor.close()
+
+    @staticmethod
+    def _list_segments(user_id: int, filter: str) -> List[tuple]:
+        """Сегменты списка: (таблица, условие, параметры, ключ сортировки, по убыванию).
+
+        Каждый сегмент читается по своему составному индексу с ключом
+        (ключ, id), поэтому любая страница — это поиск по индексу плюс LIMIT.
+        Фильтр 'all' — активные задачи, затем выполненные (как раньше
+        ORDER BY completed, remind_at); NULL в remind_at идут первыми.
+        Архив (tasks_archive) — последний сегмент 'completed' и 'all': к нему
+        обращаемся, только когда клиент пролистал все горячие задачи.
+        """
+        remind_key = 'IFNULL(remind_at, -1)'
+        if filter == 'today':
+            today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            today_end = today_start.replace(hour=23, minute=59, second=59)
+            return [(
+                'tasks',
+                'user_id = ? AND remind_at BETWEEN ? AND ?',
+                (user_id, encode_ts(today_start), encode_ts(today_end)),
+                'remind_at', False
+            )]
+        active = ('tasks', 'user_id = ? AND completed = 0', (user_id,), remind_key, False)
+        archive = ('tasks_archive', 'user_id = ?', (user_id,), 'updated_at', True)
+        if filter == 'active':
+            return [active]
+        if filter == 'completed':
+            return [('tasks', 'user_id = ? AND completed = 1', (user_id,), 'updated_at', True), archive]
+        return [active, ('tasks', 'user_id = ? AND completed = 1', (user_id,), remind_key, False), archive]
+
+    @staticmethod
+    async def get_page(
+        user_id: int,
+        filter: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        include_archive: Optional[bool] = None
+    ) -> TaskPage:
+        """Получить страницу задач (keyset-пагинация)
+
+        Args:
+            filter: all, today, active, completed
+            limit: размер страницы (None — все задачи)
+            cursor: непрозрачный курсор из предыдущей страницы
+            include_archive: читать ли архив (сегмент tasks_archive). По
+                умолчанию — только при постраничном чтении: туда доходят,
+                пролистав горячие задачи. Список без limit архив целиком
+                не читает, если его не попросили явно
+
+        Raises:
+            ValueError: курсор повреждён или выдан для другого фильтра
+        """
+        filter = filter if filter in ('today', 'active', 'completed') else 'all'
+        if include_archive is None:
+            include_archive = limit is not None
+        cache_key = (user_id, 'page', filter, limit, cursor, include_archive)
+        page = task_cache.get(cache_key)
+        if page is not MISS:
+            return page
+
+        generation = task_cache.generation()
+        segments = TaskRepository._list_segments(user_id, filter)
+        if not include_archive:
+            # Архив — всегда последний сегмент, номера остальных не меняются
+            segments = [segment for segment in segments if segment[0] != 'tasks_archive']
+
+        start_segment, after = 0, None
+        if cursor:
+            start_segment, key, last_id = _decode_cursor(cursor, filter)
+            # Из JSON может прийти что угодно: в SQL идут только скаляры
+            # (bool — подкласс int, его отсекаем отдельно)
+            if (
+                not _is_scalar(start_segment, int)
+                or not _is_scalar(key, (int, str))
+                or not _is_scalar(last_id, (int, str))
+                or not 0 <= start_segment < len(segments)
+            ):
+                raise ValueError('Invalid cursor')
+            after = (key, last_id)
+
+        rows = []
+        # Версия и строки — из одного снимка: клиент продолжит с /changes
+        # ровно с того места, которое видит в странице
+        async with read_snapshot(shard_for_user(user_id)) as db:
+            db_cursor = await db.execute(
+                'SELECT version FROM task_counters WHERE user_id = ?', (user_id,)
+            )
+            version_row = await db_cursor.fetchone()
+            for index in range(start_segment, len(segments)):
+                table, where, params, key_expr, descending = segments[index]
+                op, order = ('<', 'DESC') if descending else ('>', 'ASC')
+                sql = f'SELECT *, {key_expr} AS _cursor_key FROM {table} WHERE {where}'
+                if after is not None and index == start_segment:
+                    sql += f' AND {key_expr} {op}= ? AND ({key_expr} {op} ? OR id {op} ?)'
+                    params = (*params, after[0], after[0], after[1])
+                sql += f' ORDER BY {key_expr} {order}, id {order}'
+                if limit is not None:
+                    # +1 строка — чтобы понять, есть ли следующая страница
+                    sql += ' LIMIT ?'
+                    params = (*params, limit + 1 - len(rows))
+
+                db_cursor = await db.execute(sql, params)
+                columns = description_columns(db_cursor.description)
+                rows.extend((index, columns, row) for row in await db_cursor.fetchall())
+                if limit is not None and len(rows) > limit:
+                    break
+
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            index, _, last = rows[-1]
+            next_cursor = _encode_cursor(filter, [index, last[-1], last[0]])
+
+        page = TaskPage(
+            tasks=[Task.from_row(row, columns) for _, columns, row in rows],
+            next_cursor=next_cursor,
+            version=version_row[0] if version_row else 0
         )
-        rows = await cursor.fetchall()
-        return [Task.from_row(row) for row in rows]
+        task_cache.set(cache_key, page, generation)
+        return page
     
     @staticmethod
-    async def get_pending_reminders() -> List[Task]:
-        """Получить задачи, которые нужно напомнить"""
-        now = datetime.now().isoformat()
-        
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            SELECT * FROM tasks 
-            WHERE remind_at <= ? 
-            AND completed = FALSE 
-            AND notified = FALSE
-            ''',
-            (now,)
+    async def search(
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> TaskPage:
+        """Полнотекстовый поиск по задачам пользователя (включая архив)
+
+        Каждое слово запроса (длиннее одной буквы) ищется как начало слова:
+        "звон" найдёт "звонок" и "звонить", но не "позвонить". Все слова
+        должны встретиться. Результаты упорядочены по релевантности (bm25).
+        "ё" и "е" не различаются. Без FTS5 поиск идёт через LIKE по
+        подстроке (регистр не учитывается только для латиницы), новые
+        задачи первыми.
+
+        Raises:
+            ValueError: курсор повреждён
+        """
+        offset = 0
+        if cursor:
+            offset, = _decode_cursor(cursor, 'search', size=1)
+            if not _is_scalar(offset, int) or offset < 0:
+                raise ValueError('Invalid cursor')
+
+        terms = _search_terms(query)
+        if not terms:
+            return TaskPage(tasks=[])
+
+        cache_key = (user_id, 'search', ' '.join(terms), limit, cursor)
+        page = task_cache.get(cache_key)
+        if page is not MISS:
+            return page
+
+        generation = task_cache.generation()
+        async with read_db(shard_for_user(user_id)) as db:
+            if await _has_fts(db):
+                # Однобуквенный префикс совпадает почти со всем индексом —
+                # такие слова ищем целиком
+                match = f'owner : u{user_id} AND ' + ' AND '.join(
+                    f'text : "{term}"' + ('*' if len(term) > 1 else '') for term in terms
+                )
+                db_cursor = await db.execute(
+                    '''
+                    SELECT rowid FROM tasks_fts
+                    WHERE tasks_fts MATCH ?
+                    ORDER BY bm25(tasks_fts, 1.0, 0.0), rowid
+                    LIMIT ? OFFSET ?
+                    ''',
+                    (match, limit + 1, offset)
+                )
+                ids = [row[0] for row in await db_cursor.fetchall()]
+                found = {}
+                if ids:
+                    placeholders = ', '.join('?' * len(ids))
+                    for table in ('tasks', 'tasks_archive'):
+                        db_cursor = await db.execute(
+                            f'SELECT * FROM {table} WHERE user_id = ? AND id IN ({placeholders})',
+                            (user_id, *ids)
+                        )
+                        columns = description_columns(db_cursor.description)
+                        for row in await db_cursor.fetchall():
+                            found[row[0]] = Task.from_row(row, columns)
+                has_more = len(ids) > limit
+                tasks = [found[task_id] for task_id in ids[:limit] if task_id in found]
+            else:
+                columns = ', '.join(TASK_COLUMNS)
+                where = 'user_id = ?' + " AND replace(lower(text), 'ё', 'е') LIKE ? ESCAPE '\\'" * len(terms)
+                patterns = [
+                    '%' + re.sub(r'([%_\\])', r'\\\1', term) + '%' for term in terms
+                ]
+                db_cursor = await db.execute(
+                    f'''
+                    SELECT {columns} FROM tasks WHERE {where}
+                    UNION ALL
+                    SELECT {columns} FROM tasks_archive WHERE {where}
+                    ORDER BY updated_at DESC, id DESC
+                    LIMIT ? OFFSET ?
+                    ''',
+                    (user_id, *patterns, user_id, *patterns, limit + 1, offset)
+                )
+                columns = description_columns(db_cursor.description)
+                rows = await db_cursor.fetchall()
+                has_more = len(rows) > limit
+                tasks = [Task.from_row(row, columns) for row in rows[:limit]]
+
+        page = TaskPage(
+            tasks=tasks,
+            next_cursor=_encode_cursor('search', [offset + limit]) if has_more else None
         )
-        rows = await cursor.fetchall()
-        return [Task.from_row(row) for row in rows]
-    
+        task_cache.set(cache_key, page, generation)
+        return page
+
+    @staticmethod
+    async def get_range(user_id: int, start: datetime, end: datetime, limit: int = 1000) -> List[Task]:
+        """Задачи со временем в [start, end), включая архив (для календаря)
+
+        Время задачи — event_at, у задач без события — remind_at; выборка —
+        поиск по индексу (user_id, время) в каждой таблице. Сортировка по
+        времени, затем по id; не больше ``limit`` задач.
+        """
+        key = (user_id, 'range', start, end, limit)
+        tasks = task_cache.get(key)
+        if tasks is not MISS:
+            return tasks
+
+        generation = task_cache.generation()
+        tasks = []
+        async with read_db(shard_for_user(user_id)) as db:
+            for table in ('tasks', 'tasks_archive'):
+                cursor = await db.execute(
+                    f'''
+                    SELECT * FROM {table}
+                    WHERE user_id = ? AND {EVENT_KEY} >= ? AND {EVENT_KEY} < ?
+                    ORDER BY {EVENT_KEY}, id
+                    LIMIT ?
+                    ''',
+                    (user_id, encode_ts(start), encode_ts(end), limit)
+                )
+                tasks.extend(Task.from_rows(await cursor.fetchall(), cursor.description))
+
+        tasks.sort(key=lambda t: (t.event_at or t.remind_at, t.id))
+        del tasks[limit:]
+        task_cache.set(key, tasks, generation)
+        return tasks
+
+    @staticmethod
+    async def get_day_counts(user_id: int, start: datetime, end: datetime) -> Dict[str, int]:
+        """Число задач по дням (ключ — YYYY-MM-DD) в [start, end), включая архив
+
+        Для сетки месяца: читается только время задач, дни без задач
+        в результат не попадают.
+        """
+        key = (user_id, 'days', start, end)
+        counts = task_cache.get(key)
+        if counts is not MISS:
+            return counts
+
+        generation = task_cache.generation()
+        counts = {}
+        async with read_db(shard_for_user(user_id)) as db:
+            for table in ('tasks', 'tasks_archive'):
+                cursor = await db.execute(
+                    f'SELECT {EVENT_KEY} FROM {table} WHERE user_id = ? AND {EVENT_KEY} >= ? AND {EVENT_KEY} < ?',
+                    (user_id, encode_ts(start), encode_ts(end))
+                )
+                for value, in await cursor.fetchall():
+                    day = decode_ts(value).date().isoformat()
+                    counts[day] = counts.get(day, 0) + 1
+
+        counts = dict(sorted(counts.items()))
+        task_cache.set(key, counts, generation)
+        return counts
+
+    @staticmethod
+    async def get_version(user_id: int) -> int:
+        """Текущая версия изменений задач пользователя (0 — изменений не было)"""
+        async with read_db(shard_for_user(user_id)) as db:
+            cursor = await db.execute(
+                'SELECT version FROM task_counters WHERE user_id = ?', (user_id,)
+            )
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    async def get_changes(user_id: int, since: int, limit: int = 500) -> TaskChanges:
+        """Задачи, изменённые после версии ``since``, и id удалённых
+
+        Каждый источник (tasks, tasks_archive, task_tombstones) читается по
+        индексу (user_id, version) с LIMIT, поэтому стоимость зависит от
+        числа изменений, а не от размера списка. Изменения отдаются по
+        возрастанию версии, не больше ``limit`` за раз. Все запросы идут в
+        одном снимке: иначе задача, созданная между ними и удалённая до
+        чтения tombstones, выпала бы из ответа, а версия её перескочила бы.
+        """
+        async with read_snapshot(shard_for_user(user_id)) as db:
+            cursor = await db.execute(
+                'SELECT version, pruned_version FROM task_counters WHERE user_id = ?',
+                (user_id,)
+            )
+            current, pruned = await cursor.fetchone() or (0, 0)
+            if since > current or since < pruned:
+                return TaskChanges(tasks=[], deleted=[], version=current, full_resync=True)
+
+            changes = []
+            for table in ('tasks', 'tasks_archive'):
+                cursor = await db.execute(
+                    f'''
+                    SELECT * FROM {table}
+                    WHERE user_id = ? AND version > ?
+                    ORDER BY version
+                    LIMIT ?
+                    ''',
+                    (user_id, since, limit + 1)
+                )
+                columns = description_columns(cursor.description)
+                for row in await cursor.fetchall():
+                    task = Task.from_row(row, columns)
+                    changes.append((task.version, task))
+            cursor = await db.execute(
+                '''
+                SELECT version, task_id FROM task_tombstones
+                WHERE user_id = ? AND version > ?
+                ORDER BY version
+                LIMIT ?
+                ''',
+                (user_id, since, limit + 1)
+            )
+            changes.extend(await cursor.fetchall())
+
+        changes.sort(key=lambda change: change[0])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        version = changes[-1][0] if has_more else current
+
+        return TaskChanges(
+            tasks=[change[1] for change in changes if isinstance(change[1], Task)],
+            deleted=[change[1] for change in changes if not isinstance(change[1], Task)],
+            version=version,
+            has_more=has_more
+        )
+
+    @staticmethod
+    async def get_pending_reminders(
+        limit: int = 500,
+        until: Optional[datetime] = None
+    ) -> List[PendingReminder]:
+        """Получить задачи, которые нужно напомнить
+
+        Запрос идёт по частичному индексу idx_tasks_pending_remind, выбирает
+        только нужные планировщику поля и не больше ``limit`` строк
+        (самые ранние первыми). Шарды опрашиваются параллельно. Напоминания,
+        следующая попытка которых позже ``until``, не возвращаются.
+
+        Args:
+            until: напоминания со временем не позже этого (по умолчанию — сейчас)
+        """
+        until = until or datetime.now()
+        now = encode_ts(until)
+        clock = int(until.timestamp())
+
+        async def scan(shard: int) -> list:
+            async with read_db(shard) as db:
+                cursor = await db.execute(
+                '''
+                    SELECT id, user_id, text, category, remind_at, attempts, next_attempt_at
+                    FROM tasks
+                    WHERE remind_at <= ?
+                    AND completed = 0
+                    AND notified = 0
+                    AND dead_letter_at IS NULL
+                    AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+                    ORDER BY remind_at
+                    LIMIT ?
+                    ''',
+                    (now, clock, limit)
+                )
+                return await cursor.fetchall()
+
+        if DB_SHARDS == 1:
+            rows = await scan(0)
+        else:
+            shards = await asyncio.gather(*(scan(shard) for shard in range(DB_SHARDS)))
+            rows = sorted((row for rows in shards for row in rows), key=lambda row: row[4])[:limit]
+        return [PendingReminder.from_row(row) for row in rows]
+
+    @staticmethod
+    async def claim_reminders(
+        owner: str,
+        lease_seconds: float,
+        limit: int = 500
+    ) -> List[PendingReminder]:
+        """Захватить наступившие напоминания для отправки экземпляром ``owner``
+
+        Отбор и захват — один UPDATE ... WHERE id IN (SELECT ... LIMIT)
+        RETURNING в транзакции писателя: два экземпляра бота одну задачу не
+        получат. Берутся свободные задачи, задачи с истёкшей арендой (их
+        владелец, видимо, упал) и свои собственные — аренда продлевается
+        до ``lease_seconds`` от текущего момента. Не больше ``limit`` задач
+        в каждом шарде. Пропускаются dead-letter и задачи, время повторной
+        попытки которых ещё не пришло.
+        """
+        now = encode_ts(datetime.now())
+        clock = int(time.time())
+        expires = clock + max(1, int(lease_seconds))
+
+        async def op(db):
+            cursor = await db.execute(
+                '''
+                UPDATE tasks SET claimed_by = ?, claim_expires_at = ?
+                WHERE id IN (
+                    SELECT id FROM tasks
+                    WHERE remind_at <= ?
+                    AND completed = 0
+                    AND notified = 0
+                    AND dead_letter_at IS NULL
+                    AND (next_attempt_at IS NULL OR next_attempt_at <= ?)
+                    AND (claimed_by IS NULL OR claimed_by = ? OR claim_expires_at <= ?)
+                    ORDER BY remind_at
+                    LIMIT ?
+                )
+                RETURNING id, user_id, text, category, remind_at, attempts, next_attempt_at
+                ''',
+                (owner, expires, now, clock, owner, clock, limit)
+            )
+            return await cursor.fetchall()
+
+        shards = await asyncio.gather(*(run_write(op, shard) for shard in range(DB_SHARDS)))
+        # RETURNING не сохраняет порядок подзапроса
+        rows = sorted((row for rows in shards for row in rows), key=lambda row: row[4])
+        return [PendingReminder.from_row(row) for row in rows]
+
+    @staticmethod
+    async def renew_claims(owner: str, task_ids: Iterable[int], lease_seconds: float) -> List[int]:
+        """Продлить аренду задач, которые ``owner`` ещё отправляет
+
+        Returns:
+            id задач, аренда которых продлена; остальные уже отправлены или
+            перехвачены другим экземпляром после истечения аренды
+        """
+        expires = int(time.time()) + max(1, int(lease_seconds))
+        by_shard: Dict[int, List[int]] = {}
+        for task_id in set(task_ids):
+            by_shard.setdefault(shard_for_task(task_id), []).append(task_id)
+
+        def make_op(ids: List[int]):
+            async def op(db):
+                renewed = []
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cursor = await db.execute(
+                        f'''
+                        UPDATE tasks SET claim_expires_at = ?
+                        WHERE id IN ({placeholders}) AND claimed_by = ? AND notified = 0
+                        RETURNING id
+                        ''',
+                        (expires, *chunk, owner)
+                    )
+                    renewed.extend(row[0] for row in await cursor.fetchall())
+                return renewed
+            return op
+
+        renewed = await asyncio.gather(*(
+            run_write(make_op(ids), shard) for shard, ids in by_shard.items()
+        ))
+        return [task_id for ids in renewed for task_id in ids]
+
+    @staticmethod
+    async def release_claims(owner: str) -> int:
+        """Снять аренду ``owner`` с неотправленных задач (при остановке бота)
+
+        Returns:
+            Количество освобождённых задач
+        """
+        async def op(db):
+            cursor = await db.execute(
+                '''
+                UPDATE tasks SET claimed_by = NULL, claim_expires_at = NULL
+                WHERE claimed_by = ? AND notified = 0
+                ''',
+                (owner,)
+            )
+            return cursor.rowcount
+
+        released = await asyncio.gather(*(run_write(op, shard) for shard in range(DB_SHARDS)))
+        return sum(released)
+
+    @staticmethod
+    async def get_events(shard: int, after_id: int, limit: int = 500) -> List[TaskEvent]:
+        """События outbox шарда с id больше ``after_id`` (по возрастанию id)"""
+        async with read_db(shard) as db:
+            cursor = await db.execute(
+                '''
+                SELECT id, task_id, user_id, kind, remind_at, completed, notified
+                FROM task_events
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                ''',
+                (after_id, limit)
+            )
+            rows = await cursor.fetchall()
+        return [TaskEvent.from_row(row) for row in rows]
+
+    @staticmethod
+    async def last_event_id(shard: int) -> int:
+        """id последнего события outbox шарда (0 — событий нет)"""
+        async with read_db(shard) as db:
+            cursor = await db.execute('SELECT IFNULL(MAX(id), 0) FROM task_events')
+            row = await cursor.fetchone()
+        return row[0]
+
+    @staticmethod
+    async def prune_events(older_than_hours: int = 24) -> int:
+        """Удалить старые события outbox во всех шардах
+
+        Returns:
+            Количество удалённых событий
+        """
+        async def op(db):
+            cursor = await db.execute(
+                "DELETE FROM task_events WHERE created_at < datetime('now', ?)",
+                (f'-{older_than_hours} hours',)
+            )
+            return cursor.rowcount
+
+        deleted = await asyncio.gather(*(run_write(op, shard) for shard in range(DB_SHARDS)))
+        return sum(deleted)
+
     @staticmethod
     async def update(
         task_id: int,
@@ -146,134 +872,473 @@ class TaskRepository:
         reminder_offset_minutes: Optional[int] = None,
         remind_at: Optional[datetime] = None,
         completed: Optional[bool] = None
-    ) -> bool:
-        """Обновить задачу"""
-        # Собираем поля для обновления
-        updates = []
-        values = []
-        
-        if text is not None:
-            updates.append('text = ?')
-            values.append(text)
-        
-        if category is not None:
-            updates.append('category = ?')
-            values.append(category)
-        
-        if event_at is not None:
-            updates.append('event_at = ?')
-            values.append(event_at.isoformat())
+    ) -> Optional[Task]:
+        """Обновить задачу
 
-        if reminder_offset_minutes is not None:
-            updates.append('reminder_offset_minutes = ?')
-            values.append(reminder_offset_minutes)
+        Существование проверяет и свежую строку возвращает один
+        UPDATE ... RETURNING.
 
-        if remind_at is not None:
-            updates.append('remind_at = ?')
-            values.append(remind_at.isoformat())
-        
-        if completed is not None:
-            updates.append('completed = ?')
-            values.append(completed)
-        
+        Returns:
+            Обновлённая задача; None — задачи нет или менять нечего
+        """
+        updates, values = _update_assignments(
+            text=text,
+            category=category,
+            event_at=event_at,
+            reminder_offset_minutes=reminder_offset_minutes,
+            remind_at=remind_at,
+            completed=completed
+        )
         if not updates:
-            return False
-        
-        updates.append('updated_at = ?')
-        values.append(datetime.now().isoformat())
-        
+            return None
+
         values.extend([task_id, user_id])
-        
-        db = await get_db()
-        cursor = await db.execute(
-            f'''
-            UPDATE tasks 
-            SET {', '.join(updates)}
-            WHERE id = ? AND user_id = ?
-            ''',
-            values
-        )
-        await db.commit()
-        return cursor.rowcount > 0
+
+        async def op(db):
+            sql = f'''
+                UPDATE tasks
+                SET {', '.join(updates)}
+                WHERE id = ? AND user_id = ?
+                RETURNING *
+            '''
+            task = await _returned_task(db, await db.execute(sql, values))
+            if task is None and await TaskRepository._restore_archived(db, task_id, user_id):
+                task = await _returned_task(db, await db.execute(sql, values))
+            return task
+
+        task = await run_write(op, shard_for_user(user_id))
+        if task is not None:
+            task_cache.invalidate_user(user_id)
+        return task
     
     @staticmethod
-    async def toggle_completed(task_id: int, user_id: int) -> bool:
-        """Переключить статус выполнения"""
-        db = await get_db()
-        cursor = await db.execute(
-            '''
-            UPDATE tasks 
-            SET completed = NOT completed, updated_at = ?
+    async def toggle_completed(task_id: int, user_id: int) -> Optional[Task]:
+        """Переключить статус выполнения
+
+        Returns:
+            Задача с новым статусом; None — задачи нет
+        """
+        sql = f'''
+            UPDATE tasks
+            SET completed = NOT completed, updated_at = ?, version = {NEXT_VERSION}
             WHERE id = ? AND user_id = ?
-            ''',
-            (datetime.now().isoformat(), task_id, user_id)
-        )
-        await db.commit()
-        return cursor.rowcount > 0
+            RETURNING *
+        '''
+        params = (encode_ts(datetime.now()), task_id, user_id)
+
+        async def op(db):
+            task = await _returned_task(db, await db.execute(sql, params))
+            if task is None and await TaskRepository._restore_archived(db, task_id, user_id):
+                task = await _returned_task(db, await db.execute(sql, params))
+            return task
+
+        task = await run_write(op, shard_for_user(user_id))
+        if task is not None:
+            task_cache.invalidate_user(user_id)
+        return task
     
+    @staticmethod
+    async def batch(user_id: int, operations: List[dict]) -> List[BatchResult]:
+        """Выполнить пачку операций одной транзакцией
+
+        Элемент ``operations`` — словарь с ключом ``op`` (create, update,
+        toggle, delete), ``task_id`` для всех, кроме create, и полями задачи
+        (как у create/update). Существование задач проверяется одним
+        запросом заранее; подряд идущие однотипные операции выполняются
+        одним executemany, порядок операций сохраняется.
+
+        Returns:
+            Результат для каждой операции, в том же порядке
+        """
+        results: List[Optional[BatchResult]] = [None] * len(operations)
+        now = encode_ts(datetime.now())
+
+        async def op(db):
+            task_ids = {o.get('task_id') for o in operations if o['op'] != 'create'} - {None}
+            existing, archived = set(), set()
+            if task_ids:
+                placeholders = ', '.join('?' * len(task_ids))
+                for table, found in (('tasks', existing), ('tasks_archive', archived)):
+                    cursor = await db.execute(
+                        f'SELECT id FROM {table} WHERE user_id = ? AND id IN ({placeholders})',
+                        (user_id, *task_ids)
+                    )
+                    found.update(row[0] for row in await cursor.fetchall())
+
+            # Задачи из архива, которые меняются, сначала возвращаем в tasks
+            changed = {o.get('task_id') for o in operations if o['op'] in ('update', 'toggle')}
+            for task_id in archived & changed:
+                await TaskRepository._restore_archived(db, task_id, user_id)
+                existing.add(task_id)
+            archived -= existing
+
+            run_sql, run = None, []
+
+            async def flush():
+                if not run:
+                    return
+                await db.executemany(run_sql, [params for _, params in run])
+                if run_sql.lstrip().startswith('INSERT'):
+                    # id под AUTOINCREMENT выдаются подряд: последний — last_insert_rowid()
+                    cursor = await db.execute('SELECT last_insert_rowid()')
+                    last_id = (await cursor.fetchone())[0]
+                    for offset, (index, _) in enumerate(run):
+                        results[index] = BatchResult('created', last_id - len(run) + 1 + offset)
+                run.clear()
+
+            for index, item in enumerate(operations):
+                kind, task_id = item['op'], item.get('task_id')
+                sql, params = None, None
+
+                if kind == 'create':
+                    if not item.get('text'):
+                        results[index] = BatchResult('invalid')
+                        continue
+                    sql = '''
+                        INSERT INTO tasks (
+                            user_id, text, category, event_at, remind_at, reminder_offset_minutes,
+                            completed, created_at, updated_at
+                        )
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    '''
+                    params = (
+                        user_id,
+                        item['text'],
+                        item.get('category') or 'reminder',
+                        encode_ts(item.get('event_at')),
+                        encode_ts(_compute_remind(
+                            item.get('event_at'), item.get('reminder_offset_minutes'), item.get('remind_at')
+                        )),
+                        item.get('reminder_offset_minutes'),
+                        bool(item.get('completed', False)),
+                        now,
+                        now
+                    )
+                elif kind not in ('update', 'toggle', 'delete') or task_id is None:
+                    results[index] = BatchResult('invalid', task_id)
+                    continue
+                elif kind == 'delete' and task_id in archived:
+                    archived.discard(task_id)
+                    sql = 'DELETE FROM tasks_archive WHERE id = ? AND user_id = ?'
+                    params = (task_id, user_id)
+                    results[index] = BatchResult('deleted', task_id)
+                elif task_id not in existing:
+                    results[index] = BatchResult('not_found', task_id)
+                    continue
+                elif kind == 'delete':
+                    existing.discard(task_id)
+                    sql = 'DELETE FROM tasks WHERE id = ? AND user_id = ?'
+                    params = (task_id, user_id)
+                    results[index] = BatchResult('deleted', task_id)
+                elif kind == 'toggle':
+                    sql = '''
+                        UPDATE tasks
+                        SET completed = NOT completed, updated_at = ?
+                        WHERE id = ? AND user_id = ?
+                    '''
+                    params = (now, task_id, user_id)
+                    results[index] = BatchResult('toggled', task_id)
+                else:
+                    updates, values = _update_assignments(
+                        text=item.get('text'),
+                        category=item.get('category'),
+                        event_at=item.get('event_at'),
+                        reminder_offset_minutes=item.get('reminder_offset_minutes'),
+                        remind_at=item.get('remind_at'),
+                        completed=item.get('completed')
+                    )
+                    if not updates:
+                        results[index] = BatchResult('invalid', task_id)
+                        continue
+                    sql = f"UPDATE tasks SET {', '.join(updates)} WHERE id = ? AND user_id = ?"
+                    params = (*values, task_id, user_id)
+                    results[index] = BatchResult('updated', task_id)
+
+                if sql != run_sql:
+                    await flush()
+                    run_sql = sql
+                run.append((index, params))
+
+            await flush()
+            return results
+
+        results = await run_write(op, shard_for_user(user_id))
+        if any(r.status not in ('not_found', 'invalid') for r in results):
+            task_cache.invalidate_user(user_id)
+        return results
+
     @staticmethod
     async def mark_notified(task_id: int) -> bool:
         """Отметить задачу как отправленную (напоминание отправлено)"""
-        db = await get_db()
-        cursor = await db.execute(
-            'UPDATE tasks SET notified = TRUE WHERE id = ?',
-            (task_id,)
-        )
-        await db.commit()
-        return cursor.rowcount > 0
-    
+        async def op(db):
+            cursor = await db.execute(
+                'UPDATE tasks SET notified = TRUE WHERE id = ? RETURNING user_id',
+                (task_id,)
+            )
+            return await cursor.fetchone()
+
+        row = await run_write(op, shard_for_task(task_id))
+        if row is None:
+            return False
+        task_cache.invalidate_user(row[0])
+        return True
+
+    @staticmethod
+    async def mark_notified_many(task_ids: Iterable[int], chunk_size: int = 500) -> int:
+        """Отметить отправленными сразу несколько задач
+
+        Одна транзакция на шард (шарды параллельно), UPDATE порциями по
+        ``chunk_size`` id; аренда планировщика снимается. Уже отмеченные и
+        удалённые задачи пропускаются.
+
+        Returns:
+            Количество отмеченных задач
+        """
+        by_shard: Dict[int, List[int]] = {}
+        for task_id in set(task_ids):
+            by_shard.setdefault(shard_for_task(task_id), []).append(task_id)
+
+        def make_op(ids: List[int]):
+            async def op(db):
+                user_ids = []
+                for start in range(0, len(ids), chunk_size):
+                    chunk = ids[start:start + chunk_size]
+                    placeholders = ', '.join('?' * len(chunk))
+                    cursor = await db.execute(
+                        f'''
+                        UPDATE tasks
+                        SET notified = TRUE, claimed_by = NULL, claim_expires_at = NULL
+                        WHERE id IN ({placeholders}) AND notified = 0
+                        RETURNING user_id
+                        ''',
+                        chunk
+                    )
+                    user_ids.extend(row[0] for row in await cursor.fetchall())
+                return user_ids
+            return op
+
+        marked = await asyncio.gather(*(
+            run_write(make_op(ids), shard) for shard, ids in by_shard.items()
+        ))
+        user_ids = [user_id for rows in marked for user_id in rows]
+        for user_id in set(user_ids):
+            task_cache.invalidate_user(user_id)
+        return len(user_ids)
+
+    @staticmethod
+    async def record_send_failures(failures: Iterable[Tuple[int, Optional[int], str]]) -> int:
+        """Записать неудачные отправки напоминаний
+
+        Args:
+            failures: (task_id, время следующей попытки в секундах Unix или
+                None — больше не пытаться (dead-letter), текст ошибки)
+
+        Счётчик attempts растёт, аренда снимается. Одна транзакция на шард.
+
+        Returns:
+            Количество обновлённых задач
+        """
+        dead_at = int(time.time())
+        by_shard: Dict[int, list] = {}
+        for task_id, next_attempt_at, error in failures:
+            by_shard.setdefault(shard_for_task(task_id), []).append(
+                (next_attempt_at, next_attempt_at, dead_at, error, task_id)
+            )
+
+        def make_op(rows: list):
+            async def op(db):
+                cursor = await db.executemany(
+                    '''
+                    UPDATE tasks SET
+                        attempts = attempts + 1,
+                        next_attempt_at = ?,
+                        dead_letter_at = CASE WHEN ? IS NULL THEN ? END,
+                        last_error = ?,
+                        claimed_by = NULL,
+                        claim_expires_at = NULL
+                    WHERE id = ? AND notified = 0
+                    ''',
+                    rows
+                )
+                return cursor.rowcount
+            return op
+
+        updated = await asyncio.gather(*(
+            run_write(make_op(rows), shard) for shard, rows in by_shard.items()
+        ))
+        return sum(updated)
+
     @staticmethod
     async def delete(task_id: int, user_id: int) -> bool:
         """Удалить задачу"""
-        db = await get_db()
+        async def op(db):
+            cursor = await db.execute(
+                'DELETE FROM tasks WHERE id = ? AND user_id = ?',
+                (task_id, user_id)
+            )
+            if cursor.rowcount == 0:
+                cursor = await db.execute(
+                    'DELETE FROM tasks_archive WHERE id = ? AND user_id = ?',
+                    (task_id, user_id)
+                )
+            return cursor.rowcount
+
+        changed = await run_write(op, shard_for_user(user_id))
+        if changed:
+            task_cache.invalidate_user(user_id)
+        return changed > 0
+    
+    @staticmethod
+    async def _restore_archived(db, task_id: int, user_id: int) -> bool:
+        """Вернуть задачу из архива в tasks (внутри текущей операции записи).
+
+        Нужен, когда пользователь правит или снимает отметку с задачи,
+        которую он увидел в архивной части списка выполненных.
+        """
+        columns = ', '.join(TASK_COLUMNS)
         cursor = await db.execute(
-            'DELETE FROM tasks WHERE id = ? AND user_id = ?',
+            f'''
+            INSERT INTO tasks ({columns})
+            SELECT {columns} FROM tasks_archive WHERE id = ? AND user_id = ?
+            ''',
             (task_id, user_id)
         )
-        await db.commit()
-        return cursor.rowcount > 0
+        if cursor.rowcount == 0:
+            return False
+        await db.execute('DELETE FROM tasks_archive WHERE id = ?', (task_id,))
+        return True
+
+    @staticmethod
+    async def archive_completed(older_than: datetime, batch_size: int = 500) -> int:
+        """Перенести одну порцию давно выполненных задач в tasks_archive
+
+        Берутся задачи, выполненные (последний раз изменённые) раньше
+        ``older_than``. Перенос порции — одна короткая транзакция в каждом
+        шарде (шарды обрабатываются параллельно); вызывающий код повторяет
+        вызов, пока он не вернёт меньше ``batch_size``.
+
+        Returns:
+            Количество перенесённых задач
+        """
+        cutoff = encode_ts(older_than)
+        columns = ', '.join(TASK_COLUMNS)
+
+        async def op(db):
+            cursor = await db.execute(
+                '''
+                SELECT id, user_id FROM tasks
+                WHERE completed = 1 AND updated_at < ?
+                ORDER BY updated_at
+                LIMIT ?
+                ''',
+                (cutoff, batch_size)
+            )
+            rows = await cursor.fetchall()
+            if not rows:
+                return []
+            ids = [row[0] for row in rows]
+            placeholders = ', '.join('?' * len(ids))
+            # SELECT выше идёт до транзакции записи: задачу могли успеть
+            # изменить, поэтому условие переноса повторяется в INSERT и DELETE
+            # (оба — уже под блокировкой писателя, в одном снимке)
+            await db.execute(
+                f'''
+                INSERT INTO tasks_archive ({columns}, archived_at)
+                SELECT {columns}, ? FROM tasks
+                WHERE id IN ({placeholders}) AND completed = 1 AND updated_at < ?
+                ''',
+                (encode_ts(datetime.now()), *ids, cutoff)
+            )
+            cursor = await db.execute(
+                f'''
+                DELETE FROM tasks
+                WHERE id IN ({placeholders}) AND completed = 1 AND updated_at < ?
+                RETURNING id, user_id
+                ''',
+                (*ids, cutoff)
+            )
+            return await cursor.fetchall()
+
+        moved = await asyncio.gather(*(run_write(op, shard) for shard in range(DB_SHARDS)))
+        rows = [row for rows in moved for row in rows]
+        for user_id in {row[1] for row in rows}:
+            task_cache.invalidate_user(user_id)
+        return len(rows)
+    
+    @staticmethod
+    async def compact_tombstones(older_than_days: int = 30) -> int:
+        """Удалить старые tombstones во всех шардах
+
+        Для пользователей запоминается наибольшая удалённая версия
+        (pruned_version): клиенты, отставшие сильнее, получат full_resync.
+
+        Returns:
+            Количество удалённых tombstones
+        """
+        cutoff = f'-{older_than_days} days'
+
+        async def op(db):
+            await db.execute(
+                '''
+                UPDATE task_counters SET pruned_version = MAX(pruned_version, (
+                    SELECT MAX(version) FROM task_tombstones t
+                    WHERE t.user_id = task_counters.user_id
+                    AND t.deleted_at < datetime('now', ?)
+                ))
+                WHERE user_id IN (
+                    SELECT user_id FROM task_tombstones
+                    WHERE deleted_at < datetime('now', ?)
+                )
+                ''',
+                (cutoff, cutoff)
+            )
+            cursor = await db.execute(
+                "DELETE FROM task_tombstones WHERE deleted_at < datetime('now', ?)",
+                (cutoff,)
+            )
+            return cursor.rowcount
+
+        deleted = await asyncio.gather(*(run_write(op, shard) for shard in range(DB_SHARDS)))
+        return sum(deleted)
     
     @staticmethod
     async def get_counts(user_id: int) -> dict:
-        """Получить количество задач по категории фильтров"""
+        """Получить количество задач по категории фильтров
+
+        total/active/completed берутся из task_counters (поддерживается
+        триггерами), "сегодня" — одним диапазонным запросом по
+        индексу (user_id, remind_at).
+        """
+        key = (user_id, 'counts')
+        counts = task_cache.get(key)
+        if counts is not MISS:
+            return counts
+
+        generation = task_cache.generation()
         today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         today_end = today_start.replace(hour=23, minute=59, second=59)
         
-        db = await get_db()
-        # Всего
-        cursor = await db.execute(
-            'SELECT COUNT(*) FROM tasks WHERE user_id = ?',
-            (user_id,)
-        )
-        total = (await cursor.fetchone())[0]
-
-        # Сегодня
-        cursor = await db.execute(
-            '''
-            SELECT COUNT(*) FROM tasks 
-            WHERE user_id = ? AND remind_at BETWEEN ? AND ?
-            ''',
-            (user_id, today_start.isoformat(), today_end.isoformat())
-        )
-        today = (await cursor.fetchone())[0]
-
-        # Активные
-        cursor = await db.execute(
-            'SELECT COUNT(*) FROM tasks WHERE user_id = ? AND completed = FALSE',
-            (user_id,)
-        )
-        active = (await cursor.fetchone())[0]
-
-        # Выполненные
-        cursor = await db.execute(
-            'SELECT COUNT(*) FROM tasks WHERE user_id = ? AND completed = TRUE',
-            (user_id,)
-        )
-        completed = (await cursor.fetchone())[0]
+        async with read_db(shard_for_user(user_id)) as db:
+            cursor = await db.execute(
+                '''
+                SELECT
+                    (
+                        SELECT COUNT(*) FROM tasks
+                        WHERE user_id = ? AND remind_at BETWEEN ? AND ?
+                    ),
+                    c.total, c.active, c.completed
+                FROM (SELECT 1)
+                LEFT JOIN task_counters c ON c.user_id = ?
+                ''',
+                (user_id, encode_ts(today_start), encode_ts(today_end), user_id)
+            )
+            today, total, active, completed = await cursor.fetchone()
 
-        return {
-            'all': total,
+        counts = {
+            'all': total or 0,
             'today': today,
-            'active': active,
-            'completed': completed
+            'active': active or 0,
+            'completed': completed or 0
         }
+        task_cache.set(key, counts, generation)
+        return counts
@@ -0,0 +1,118 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, List, Optional, Tuple
+
+import aiosqlite
+
+if TYPE_CHECKING:
+    from database.connection import ConnectionManager
+
+
+# Операция записи: получает подключение писателя, выполняет свои запросы
+# (без commit) и возвращает результат — lastrowid, rowcount и т.п.
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+class WriteQueue:
+    """Очередь записи с групповым коммитом (group commit).
+
+    Операции, пришедшие в течение ``window_ms`` (но не больше ``max_batch``),
+    выполняются в одной транзакции и фиксируются одним COMMIT — то есть
+    одним fsync на всю пачку вместо fsync на каждое нажатие в Mini App.
+
+    Каждая операция выполняется внутри своего SAVEPOINT: ошибка одной
+    операции откатывает только её, остальные попадают в коммит. Future
+    вызывающего кода получает результат только после успешного COMMIT.
+    """
+
+    def __init__(self, manager: 'ConnectionManager', window_ms: float = 5, max_batch: int = 64):
+        self.manager = manager
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Статистика для подбора окна и размера пачки
+        self.batches = 0
+        self.operations = 0
+
+    async def submit(self, op: WriteOp) -> Any:
+        """Поставить операцию в очередь и дождаться её коммита."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+
+            # Копим операции, пришедшие в течение окна
+            if self.window:
+                await asyncio.sleep(self.window)
+            stop = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            await self._commit_batch(batch)
+            if stop:
+                return
+
+    async def _commit_batch(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        results = []
+        try:
+            async with self.manager.write() as db:
+                # IMMEDIATE — блокировка записи берётся до первой операции: если
+                # операция начинается с чтения, а другой процесс успел закоммитить,
+                # отложенный BEGIN упал бы на первой записи с «database is locked»
+                # (повысить снимок до записи busy_timeout не помогает)
+                await db.execute('BEGIN IMMEDIATE')
+                for op, future in batch:
+                    if future.cancelled():
+                        results.append(None)
+                        continue
+                    await db.execute('SAVEPOINT write_op')
+                    try:
+                        value = await op(db)
+                    except Exception as e:
+                        await db.execute('ROLLBACK TO write_op')
+                        await db.execute('RELEASE write_op')
+                        results.append((False, e))
+                    else:
+                        await db.execute('RELEASE write_op')
+                        results.append((True, value))
+                await db.commit()
+        except Exception as e:
+            # Коммит не прошёл — вся пачка считается невыполненной
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.operations += len(batch)
+        for (_, future), result in zip(batch, results):
+            if result is None or future.done():
+                continue
+            ok, value = result
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def stop(self):
+        """Дописать уже поставленные операции и остановить обработчик."""
+        if self._worker is not None and not self._worker.done():
+            self._queue.put_nowait(None)
+            await self._worker
+        self._worker = None
+        self._queue = None
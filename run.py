@@ -24,6 +24,20 @@ def run_api():
     )
 
 
+def run_backup():
+    """Снять резервную копию базы (можно при работающих боте и API)"""
+    from database.backup import backup_database
+    for result in asyncio.run(backup_database()):
+        print(f"💾 {result.describe()}")
+
+
+def run_vacuum():
+    """Перевести базу в auto_vacuum = INCREMENTAL (разово, блокирует запись на время VACUUM)"""
+    from database.maintenance import enable_incremental_vacuum
+    for result in enable_incremental_vacuum():
+        print(f"🧹 {result.describe()}")
+
+
 def run_all():
     """Запустить бота и API вместе"""
     import subprocess
@@ -64,6 +78,8 @@ if __name__ == "__main__":
         print("  python run.py bot   — запустить бота")
         print("  python run.py api   — запустить API")
         print("  python run.py all   — запустить всё")
+        print("  python run.py backup — резервная копия базы")
+        print("  python run.py vacuum — перевести базу в auto_vacuum = INCREMENTAL")
         sys.exit(1)
     
     command = sys.argv[1]
@@ -74,6 +90,10 @@ if __name__ == "__main__":
         run_api()
     elif command == "all":
         run_all()
+    elif command == "backup":
+        run_backup()
+    elif command == "vacuum":
+        run_vacuum()
     else:
         print(f"Неизвестная команда: {command}")
         sys.exit(1)
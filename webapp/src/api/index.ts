@@ -31,6 +31,15 @@ function adaptTaskFromAPI(apiTask: Task): TaskInterface {
     };
 }
 
+/**
+ * Локальное время без часового пояса (как хранит сервер): 2024-12-20T00:00:00
+ */
+function toLocalISO(date: Date): string {
+    const pad = (n: number) => String(n).padStart(2, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}` +
+        `T${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`;
+}
+
 /**
  * Базовый запрос к API
  */
@@ -72,6 +81,34 @@ export const api = {
         return {
             tasks: response.tasks.map(adaptTaskFromAPI),
             counts: response.counts,
+            version: response.version ?? 0,
+        };
+    },
+
+    // Получить изменения после версии since (дельта-синхронизация)
+    async getChanges(since: number) {
+        const response = await request<TaskChangesResponse>('GET', `/api/tasks/changes?since=${since}`);
+        return {
+            tasks: response.tasks.map(adaptTaskFromAPI),
+            deleted: response.deleted,
+            version: response.version,
+            hasMore: response.has_more,
+            fullResync: response.full_resync,
+        };
+    },
+
+    // Задачи за период [from, to) и/или число задач по дням (календарь)
+    async getRange(from: Date, to: Date, options: { tasks?: boolean; days?: boolean } = {}) {
+        const params = new URLSearchParams({
+            from: toLocalISO(from),
+            to: toLocalISO(to),
+            tasks: String(options.tasks ?? true),
+            days: String(options.days ?? false),
+        });
+        const response = await request<TaskRangeResponse>('GET', `/api/tasks/range?${params}`);
+        return {
+            tasks: response.tasks.map(adaptTaskFromAPI),
+            days: response.days ?? {},
         };
     },
 
@@ -82,17 +119,17 @@ export const api = {
 
     // Создать задачу
     createTask: (data: CreateTaskData) => {
-        return request<{ status: string; id: number }>('POST', '/api/tasks', data);
+        return request<TaskMutationResponse>('POST', '/api/tasks', data);
     },
 
     // Обновить задачу
     updateTask: (taskId: number, data: UpdateTaskData) => {
-        return request<{ status: string }>('PUT', `/api/tasks/${taskId}`, data);
+        return request<TaskMutationResponse>('PUT', `/api/tasks/${taskId}`, data);
     },
 
     // Переключить статус
     toggleTask: (taskId: number) => {
-        return request<{ status: string }>('POST', '/api/tasks/toggle', { task_id: taskId });
+        return request<TaskMutationResponse>('POST', '/api/tasks/toggle', { task_id: taskId });
     },
 
     // Удалить задачу
@@ -114,9 +151,31 @@ export interface Task {
     updated_at: string;
 }
 
+// Ответ create/update/toggle: задача уже в новом состоянии
+export interface TaskMutationResponse {
+    status: string;
+    id: number;
+    task: Task;
+}
+
 export interface TaskListResponse {
     tasks: Task[];
     counts: CountsResponse;
+    version?: number;
+}
+
+export interface TaskRangeResponse {
+    tasks: Task[];
+    // Число задач по дням "YYYY-MM-DD" (при days=true)
+    days?: Record<string, number> | null;
+}
+
+export interface TaskChangesResponse {
+    tasks: Task[];
+    deleted: number[];
+    version: number;
+    has_more: boolean;
+    full_resync: boolean;
 }
 
 export interface CountsResponse {
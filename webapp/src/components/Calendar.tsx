@@ -1,5 +1,6 @@
-import { useState, useMemo } from 'react';
+import { useState, useMemo, useEffect } from 'react';
 import { useTelegram } from '@/hooks/useTelegram';
+import { api } from '@/api';
 
 interface CalendarProps {
   selectedDate: Date;
@@ -13,12 +14,35 @@ const MONTHS = [
   'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'
 ];
 
+// Ключ дня в ответе /api/tasks/range: YYYY-MM-DD
+const dayKey = (date: Date) =>
+  `${date.getFullYear()}-${String(date.getMonth() + 1).padStart(2, '0')}-${String(date.getDate()).padStart(2, '0')}`;
+
 export function Calendar({ selectedDate, onSelect, onClose }: CalendarProps) {
   const { theme, hapticFeedback } = useTelegram();
   const [currentMonth, setCurrentMonth] = useState(() => {
     return new Date(selectedDate.getFullYear(), selectedDate.getMonth(), 1);
   });
 
+  // Сколько задач в каждый день видимого месяца (точка под датой)
+  const [dayCounts, setDayCounts] = useState<Record<string, number>>({});
+
+  useEffect(() => {
+    let cancelled = false;
+    const start = new Date(currentMonth.getFullYear(), currentMonth.getMonth(), 1);
+    const end = new Date(currentMonth.getFullYear(), currentMonth.getMonth() + 1, 1);
+    api.getRange(start, end, { tasks: false, days: true })
+      .then(({ days }) => {
+        if (!cancelled) setDayCounts(days);
+      })
+      .catch(() => {
+        if (!cancelled) setDayCounts({});
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [currentMonth]);
+
   const today = useMemo(() => {
     const d = new Date();
     d.setHours(0, 0, 0, 0);
@@ -179,12 +203,13 @@ export function Calendar({ selectedDate, onSelect, onClose }: CalendarProps) {
             const selected = isSelected(date);
             const todayDate = isToday(date);
             const past = isPast(date);
+            const hasTasks = (dayCounts[dayKey(date)] ?? 0) > 0;
 
             return (
               <button
                 key={date.toISOString()}
                 onClick={() => handleSelectDate(date)}
-                className="aspect-square flex items-center justify-center rounded-xl text-sm font-medium transition-all active:scale-90"
+                className="relative aspect-square flex items-center justify-center rounded-xl text-sm font-medium transition-all active:scale-90"
                 style={{
                   backgroundColor: selected 
                     ? theme.buttonColor 
@@ -202,6 +227,12 @@ export function Calendar({ selectedDate, onSelect, onClose }: CalendarProps) {
                 }}
               >
                 {date.getDate()}
+                {hasTasks && (
+                  <span
+                    className="absolute bottom-1 w-1 h-1 rounded-full"
+                    style={{ backgroundColor: selected ? theme.buttonTextColor : theme.buttonColor }}
+                  />
+                )}
               </button>
             );
           })}
@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { api } from '@/api';
 import type { Task, TaskFilter } from '@/types/task';
 
@@ -21,12 +21,21 @@ interface UseTasksReturn {
   refetch: () => Promise<void>;
 }
 
+// Подходит ли задача под фильтр списка (для 'today' решает сервер)
+function matchesFilter(task: Task, filter: TaskFilter): boolean {
+  if (filter === 'active') return !task.completed;
+  if (filter === 'completed') return task.completed;
+  return true;
+}
+
 export function useTasks(): UseTasksReturn {
   const [tasks, setTasks] = useState<Task[]>([]);
   const [stats, setStats] = useState({ all: 0, today: 0, active: 0, completed: 0 });
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [filter, setFilter] = useState<TaskFilter>('all');
+  // Версия изменений, до которой список актуален (since для /changes)
+  const versionRef = useRef(0);
 
   const fetchTasks = useCallback(async () => {
     setLoading(true);
@@ -36,6 +45,7 @@ export function useTasks(): UseTasksReturn {
       // resp.tasks уже адаптированы (camelCase) благодаря adaptTaskFromAPI
       setTasks(resp.tasks as Task[]);
       setStats(resp.counts);
+      versionRef.current = resp.version;
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Ошибка загрузки');
     } finally {
@@ -43,6 +53,40 @@ export function useTasks(): UseTasksReturn {
     }
   }, [filter]);
 
+  // Подтянуть только изменения после последней синхронизации вместо всего списка
+  const syncChanges = useCallback(async () => {
+    if (filter === 'today') {
+      await fetchTasks();
+      return;
+    }
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const changes = await api.getChanges(versionRef.current);
+        if (changes.fullResync) {
+          await fetchTasks();
+          return;
+        }
+        const deleted = new Set<number>(changes.deleted);
+        const changed = new Map<number, Task>(changes.tasks.map((t: Task) => [t.id, t]));
+        setTasks((prev: Task[]) => {
+          const kept = prev
+            .filter((t: Task) => !deleted.has(t.id))
+            .map((t: Task) => changed.get(t.id) ?? t)
+            .filter((t: Task) => matchesFilter(t, filter));
+          const known = new Set<number>(prev.map((t: Task) => t.id));
+          const added = changes.tasks.filter((t: Task) => !known.has(t.id) && matchesFilter(t, filter));
+          return [...added, ...kept];
+        });
+        versionRef.current = changes.version;
+        hasMore = changes.hasMore;
+      }
+      setStats(await api.getCounts());
+    } catch {
+      await fetchTasks();
+    }
+  }, [filter, fetchTasks]);
+
   useEffect(() => {
     void fetchTasks();
   }, [fetchTasks]);
@@ -72,11 +116,12 @@ export function useTasks(): UseTasksReturn {
       };
       setTasks((prev: Task[]) => [newTask, ...prev]);
       setStats((prev: typeof stats) => ({ ...prev, all: prev.all + 1, active: prev.active + 1 }));
+      void syncChanges();
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Ошибка создания');
       throw err;
     }
-  }, []);
+  }, [syncChanges]);
 
   const updateTask = useCallback(async (id: string, data: Partial<Task>) => {
     try {
@@ -97,35 +142,36 @@ export function useTasks(): UseTasksReturn {
 
       await api.updateTask(numId, payload as any);
       setTasks((prev: Task[]) => prev.map((t: Task) => (t.id === numId ? { ...t, ...data, updatedAt: new Date() } : t)));
+      void syncChanges();
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Ошибка обновления');
       throw err;
     }
-  }, []);
+  }, [syncChanges]);
 
   const toggleTask = useCallback(async (id: number) => {
     try {
       // optimistic
       setTasks((prev: Task[]) => prev.map((t: Task) => (t.id === id ? { ...t, completed: !t.completed } : t)));
       await api.toggleTask(id);
-      // refetch counts
-      void fetchTasks();
+      // подтягиваем изменения и счётчики
+      void syncChanges();
     } catch (err) {
       void fetchTasks();
       throw err;
     }
-  }, [fetchTasks]);
+  }, [fetchTasks, syncChanges]);
 
   const deleteTask = useCallback(async (id: number) => {
     try {
       setTasks((prev: Task[]) => prev.filter((t: Task) => t.id !== id));
       await api.deleteTask(id);
-      void fetchTasks();
+      void syncChanges();
     } catch (err) {
       void fetchTasks();
       throw err;
     }
-  }, [fetchTasks]);
+  }, [fetchTasks, syncChanges]);
 
   return {
     tasks,